@@ -0,0 +1,45 @@
+"""
+Benchmarks for choosing the serializer of an instance, and the deserializer
+of some data, depending on the number of registered types.
+"""
+import copy
+
+import pytest
+
+from generic_relations.relations import GenericRelatedField
+
+
+pytestmark = pytest.mark.urls('generic_relations.tests.test_relations')
+
+TYPES = (1, 2, 4)
+
+
+@pytest.mark.parametrize('types', TYPES)
+def test_serializer_for_instance(measure, generic_serializers, types):
+    field = GenericRelatedField(generic_serializers('nested', types))
+    instances = [model() for model in field.serializers] * (1000 // types)
+
+    def dispatch():
+        for instance in instances:
+            field.get_serializer_for_instance(instance)
+    measure(dispatch)
+
+
+@pytest.mark.parametrize('types', TYPES)
+@pytest.mark.parametrize('children', ('nested', 'hyperlinked'))
+def test_deserializer_for_data(measure, generic_serializers, targets, payload, children, types):
+    field = GenericRelatedField(generic_serializers(children, types))
+    # The data matches the last registered serializer.
+    data = [payload(children, obj) for obj in targets(list(field.serializers)[-1:], 100)]
+
+    def dispatch():
+        for value in data:
+            field.get_deserializer_for_data(value)
+    measure(dispatch)
+
+
+@pytest.mark.parametrize('types', TYPES)
+def test_copy(measure, generic_serializers, types):
+    # What instantiating a serializer declaring the field costs.
+    field = GenericRelatedField(generic_serializers('nested', types))
+    measure(lambda: [copy.deepcopy(field) for i in range(100)])
@@ -0,0 +1,30 @@
+"""
+Benchmark for the time it takes to import the package.
+"""
+import statistics
+import subprocess
+import sys
+
+
+SCRIPT = '''
+import time
+import django
+django.setup()
+start = time.perf_counter()
+import generic_relations.relations
+import generic_relations.serializers
+print(time.perf_counter() - start)
+'''
+
+
+def test_import(benchmark):
+    # Every round imports the package in a new interpreter, so the benchmark
+    # itself includes the interpreter and Django start-up; the time spent
+    # importing the package alone is recorded in `extra_info`.
+    times = []
+
+    def run():
+        output = subprocess.check_output([sys.executable, '-c', SCRIPT])
+        times.append(float(output))
+    benchmark.pedantic(run, rounds=5, iterations=1)
+    benchmark.extra_info['import_time'] = statistics.median(times)
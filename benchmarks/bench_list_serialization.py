@@ -0,0 +1,80 @@
+"""
+Benchmarks for serializing long lists of mixed models.
+
+Run with:
+
+    pytest --ds=testsettings -o python_files='bench_*.py' benchmarks/
+
+The lists are kept short by default. Set `BENCHMARK_ITEMS` for longer ones,
+such as `BENCHMARK_ITEMS=50000 make bench`.
+"""
+import os
+from itertools import chain, zip_longest
+
+import pytest
+
+from django.db.models import prefetch_related_objects
+
+from rest_framework import serializers
+
+from generic_relations.serializers import GenericModelSerializer
+from generic_relations.tests.models import Bookmark, Note, Tag
+
+
+ITEMS = int(os.environ.get("BENCHMARK_ITEMS", 1000))
+
+
+class PrefetchingListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        prefetch_related_objects(data, 'tags')
+        return super(PrefetchingListSerializer, self).to_representation(data)
+
+
+class TaggedBookmarkSerializer(serializers.ModelSerializer):
+    tags = serializers.SlugRelatedField(many=True, read_only=True, slug_field='tag')
+
+    class Meta:
+        model = Bookmark
+        fields = ('url', 'tags')
+        list_serializer_class = PrefetchingListSerializer
+
+
+class TaggedNoteSerializer(serializers.ModelSerializer):
+    tags = serializers.SlugRelatedField(many=True, read_only=True, slug_field='tag')
+
+    class Meta:
+        model = Note
+        fields = ('text', 'tags')
+        list_serializer_class = PrefetchingListSerializer
+
+
+def get_serializers():
+    return {
+        Bookmark: TaggedBookmarkSerializer(),
+        Note: TaggedNoteSerializer(),
+    }
+
+
+@pytest.fixture
+def mixed_items(db):
+    bookmarks = Bookmark.objects.bulk_create(
+        Bookmark(url='https://example.com/%d/' % i) for i in range(ITEMS // 2))
+    notes = Note.objects.bulk_create(Note(text='Note %d' % i) for i in range(ITEMS // 2))
+    Tag.objects.bulk_create(
+        Tag(tagged_item=item, tag='tag') for item in chain(bookmarks, notes))
+
+    def load():
+        # Fresh instances for every round, so nothing stays prefetched.
+        items = zip_longest(Bookmark.objects.all(), Note.objects.all())
+        return [[item for item in chain.from_iterable(items) if item is not None]], {}
+    return load
+
+
+def test_one_at_a_time(benchmark, mixed_items):
+    serializer = serializers.ListSerializer(child=GenericModelSerializer(get_serializers()))
+    benchmark.pedantic(serializer.to_representation, setup=mixed_items, rounds=3)
+
+
+def test_grouped_by_type(benchmark, mixed_items):
+    serializer = GenericModelSerializer(get_serializers(), many=True)
+    benchmark.pedantic(serializer.to_representation, setup=mixed_items, rounds=3)
@@ -0,0 +1,57 @@
+"""
+Benchmarks for serializing lists of objects with a generic foreign key.
+"""
+import pytest
+
+from rest_framework import serializers
+
+from generic_relations.relations import GenericRelatedField, GenericRelatedListSerializer
+from generic_relations.tests.models import Tag
+
+
+pytestmark = pytest.mark.urls('generic_relations.tests.test_relations')
+
+
+@pytest.mark.parametrize('size', (100, 1000))
+@pytest.mark.parametrize('types', (1, 2, 4))
+@pytest.mark.parametrize('children', ('nested', 'hyperlinked'))
+def test_read(measure, rf, generic_serializers, targets, children, types, size):
+    field = GenericRelatedField(generic_serializers(children, types), read_only=True)
+    Tag.objects.bulk_create(
+        Tag(tag='tag-%d' % index, tagged_item=target)
+        for index, target in enumerate(targets(list(field.serializers), size)))
+
+    class TagSerializer(serializers.ModelSerializer):
+        tagged_item = field
+
+        class Meta:
+            model = Tag
+            fields = ('tag', 'tagged_item')
+            list_serializer_class = GenericRelatedListSerializer
+
+    context = {'request': rf.get('/')}
+    # A fresh queryset every round, so that no target stays cached.
+    measure(lambda: TagSerializer(Tag.objects.all(), many=True, context=context).data)
+
+
+@pytest.mark.parametrize('pointers', (False, True))
+def test_read_repeated_targets(measure, rf, generic_serializers, targets, pointers):
+    field = GenericRelatedField(
+        generic_serializers('nested', 4), read_only=True, pointers=pointers)
+    objects = targets(list(field.serializers), 20)
+    Tag.objects.bulk_create(
+        Tag(tag='tag-%d' % index, tagged_item=objects[index % len(objects)])
+        for index in range(1000))
+
+    class TagSerializer(serializers.ModelSerializer):
+        tagged_item = field
+
+        class Meta:
+            model = Tag
+            fields = ('tag', 'tagged_item')
+            list_serializer_class = GenericRelatedListSerializer
+
+    def read():
+        serializer = TagSerializer(Tag.objects.all(), many=True, context={'request': rf.get('/')})
+        return {'data': serializer.data, 'included': serializer.included}
+    measure(read)
@@ -0,0 +1,55 @@
+"""
+Benchmarks for validating lists of objects with a generic foreign key, and
+creating mixed lists of objects.
+"""
+import pytest
+
+from rest_framework import serializers
+
+from generic_relations.relations import GenericRelatedField, GenericRelatedListSerializer
+from generic_relations.serializers import GenericModelSerializer
+from generic_relations.tests.models import Tag
+
+
+pytestmark = pytest.mark.urls('generic_relations.tests.test_relations')
+
+
+@pytest.mark.parametrize('size', (100, 1000))
+@pytest.mark.parametrize('types', (1, 2, 4))
+@pytest.mark.parametrize('children', ('nested', 'hyperlinked'))
+def test_write(measure, generic_serializers, targets, payload, children, types, size):
+    field = GenericRelatedField(generic_serializers(children, types))
+    data = [
+        {'tag': 'tag-%d' % index, 'tagged_item': payload(children, target)}
+        for index, target in enumerate(targets(list(field.serializers), size))
+    ]
+
+    class TagSerializer(serializers.ModelSerializer):
+        tagged_item = field
+
+        class Meta:
+            model = Tag
+            fields = ('tag', 'tagged_item')
+            list_serializer_class = GenericRelatedListSerializer
+
+    def validate():
+        serializer = TagSerializer(data=data, many=True)
+        serializer.is_valid(raise_exception=True)
+    measure(validate)
+
+
+@pytest.mark.parametrize('size', (100, 1000))
+@pytest.mark.parametrize('types', (1, 2, 4))
+def test_create(measure, generic_serializers, targets, payload, types, size):
+    models = list(generic_serializers('nested', types))
+    data = [payload('nested', target) for target in targets(models, size)]
+
+    def setup():
+        serializer = GenericModelSerializer(
+            generic_serializers('nested', types), many=True, data=data)
+        serializer.is_valid(raise_exception=True)
+        return (serializer,), {}
+
+    def create(serializer):
+        serializer.save()
+    measure(create, setup=setup)
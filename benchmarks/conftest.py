@@ -0,0 +1,110 @@
+import tracemalloc
+
+import pytest
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework import serializers
+from rest_framework.reverse import reverse
+
+from generic_relations.tests.models import Bookmark, Detachable, Note, Tag
+
+
+# Generic relations register the last `n` of these models; the data used to
+# benchmark writes matches the last one, so every other serializer is tried
+# first.
+MODELS = (Tag, Bookmark, Note, Detachable)
+
+
+@pytest.fixture
+def measure(benchmark, db):
+    """
+    Benchmark `func`, after running it once more to record the queries it
+    makes and its peak memory use in the benchmark's `extra_info`.
+
+    `setup`, if given, is called before every run and returns the args and
+    kwargs to call `func` with, as for `benchmark.pedantic()`.
+    """
+    def measure(func, setup=None, rounds=5):
+        args, kwargs = setup() if setup is not None else ((), {})
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                func(*args, **kwargs)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        benchmark.extra_info['queries'] = len(queries)
+        benchmark.extra_info['peak_memory'] = peak
+
+        if setup is None:
+            return benchmark.pedantic(func, rounds=rounds, iterations=1)
+        return benchmark.pedantic(func, setup=setup, rounds=rounds)
+    return measure
+
+
+@pytest.fixture
+def generic_serializers():
+    """
+    Return a function building the serializers for a generic relation to
+    the last `types` models, either nested or hyperlinked.
+    """
+    def generic_serializers(children, types):
+        models = MODELS[-types:]
+        if children == 'hyperlinked':
+            return {
+                model: serializers.HyperlinkedRelatedField(
+                    view_name='%s-detail' % model._meta.model_name,
+                    queryset=model.objects.all())
+                for model in models
+            }
+        return {model: get_model_serializer(model)() for model in models}
+    return generic_serializers
+
+
+def get_model_serializer(model):
+    meta = type('Meta', (), {'model': model, 'exclude': ('id',)})
+    return type('%sSerializer' % model.__name__, (serializers.ModelSerializer,), {'Meta': meta})
+
+
+@pytest.fixture
+def payload():
+    """
+    Return a function building the data which refers to `obj` through a
+    generic relation, either nested or hyperlinked.
+    """
+    def payload(children, obj):
+        if children == 'hyperlinked':
+            return reverse('%s-detail' % obj._meta.model_name, kwargs={'pk': obj.pk})
+        return {
+            field.name: field.value_from_object(obj)
+            for field in obj._meta.concrete_fields if not field.primary_key
+        }
+    return payload
+
+
+@pytest.fixture
+def targets(db):
+    """
+    Return a function creating `count` saved objects, spread evenly across
+    the given models.
+    """
+    def targets(models, count):
+        objects = []
+        for index, model in enumerate(models):
+            objects.extend(model.objects.bulk_create(
+                make_target(model, i) for i in range(index, count, len(models))))
+        return objects
+    return targets
+
+
+def make_target(model, i):
+    if model is Bookmark:
+        return Bookmark(url='https://example.com/%d/' % i)
+    if model is Note:
+        return Note(text='Note %d' % i)
+    if model is Detachable:
+        return Detachable(name='Detachable %d' % i)
+    return Tag(tag='tag-%d' % i, content_type=ContentType.objects.get_for_model(Note), object_id=i)
@@ -1,4 +1,9 @@
+import django
+
 pkg_resources = __import__('pkg_resources')
 distribution = pkg_resources.get_distribution('rest-framework-generic-relations')
 
 __version__ = distribution.version
+
+if django.VERSION < (3, 2):
+    default_app_config = 'generic_relations.apps.GenericRelationsConfig'
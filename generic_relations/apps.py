@@ -0,0 +1,24 @@
+from django.apps import AppConfig
+from django.conf import settings
+from django.utils.module_loading import autodiscover_modules
+
+
+class GenericRelationsConfig(AppConfig):
+    name = 'generic_relations'
+    verbose_name = 'Generic relations'
+
+    def ready(self):
+        """
+        With the `GENERIC_RELATIONS_PREPARE` setting, import the `serializers`
+        module of every app and prepare the generic fields and serializers
+        they declare, so that the first requests are as fast as the next ones.
+        With `GENERIC_RELATIONS_WARM_CONTENT_TYPES`, also load the content
+        types of their models.
+        """
+        if not getattr(settings, 'GENERIC_RELATIONS_PREPARE', False):
+            return
+        autodiscover_modules('serializers')
+        # Not imported at the top, as it needs the app registry to be ready.
+        from .serializers import prepare_fields
+        prepare_fields(
+            warm_content_types=getattr(settings, 'GENERIC_RELATIONS_WARM_CONTENT_TYPES', False))
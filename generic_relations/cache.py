@@ -0,0 +1,166 @@
+import hashlib
+from collections import OrderedDict, defaultdict
+from uuid import uuid4
+from weakref import WeakKeyDictionary
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db.models.signals import post_delete, post_save
+
+
+__all__ = ('RepresentationCache', 'RepresentationMemo',)
+
+
+class RepresentationMemo(object):
+    """
+    A mapping holding at most `max_size` representations, evicting the least
+    recently used one when full.
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._representations = OrderedDict()
+
+    def __len__(self):
+        return len(self._representations)
+
+    def get(self, key, default=None):
+        try:
+            representation = self._representations[key]
+        except KeyError:
+            return default
+        self._representations.move_to_end(key)
+        return representation
+
+    def set(self, key, representation):
+        self._representations[key] = representation
+        self._representations.move_to_end(key)
+        if len(self._representations) > self.max_size:
+            self._representations.popitem(last=False)
+
+
+class RepresentationCache(object):
+    """
+    Keeps the representations produced by the serializers registered with a
+    `GenericSerializerMixin` in a Django cache, across requests.
+
+    Entries are keyed by serializer class, model, primary key and, if
+    `version_field` is given, the value of that field, as well as by what
+    else the representation depends on (see `get_variant`). They're
+    invalidated whenever an instance of a registered model is saved or
+    deleted, but not when objects it's represented with change, nor on
+    `QuerySet.update()`, `bulk_create()`, `bulk_update()` or raw SQL.
+
+    The same instance may be shared by several fields. It counts its `hits`
+    and `misses`.
+    """
+    def __init__(self, alias=DEFAULT_CACHE_ALIAS, timeout=DEFAULT_TIMEOUT,
+                 key_prefix='generic_relations', version_field=None):
+        self.alias = alias
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+        self.version_field = version_field
+        self.hits = 0
+        self.misses = 0
+        self._serializer_keys = defaultdict(set)
+        self._variants = WeakKeyDictionary()
+        post_save.connect(self.invalidate)
+        post_delete.connect(self.invalidate)
+
+    def __deepcopy__(self, memo):
+        # Fields are deep copied for every serializer instance, but they
+        # should all share the same cache.
+        return self
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def register(self, model, serializer):
+        """
+        Delete the representations by `serializer` (or a serializer of that
+        class) when instances of `model` change.
+        """
+        label = model._meta.concrete_model._meta.label_lower
+        self._serializer_keys[label].add(self.get_serializer_key(serializer))
+
+    def get_serializer_key(self, serializer):
+        serializer_class = serializer if isinstance(serializer, type) else type(serializer)
+        return '%s.%s' % (serializer_class.__module__, serializer_class.__qualname__)
+
+    def get_key(self, serializer_key, instance):
+        version = None
+        if self.version_field is not None:
+            version = getattr(instance, self.version_field, None)
+        return '%s:%s:%s:%s:%s' % (
+            self.key_prefix, serializer_key,
+            instance._meta.concrete_model._meta.label_lower, instance.pk, version,
+        )
+
+    def get_variant(self, serializer):
+        """
+        Return a hash of what the representations by `serializer` depend on
+        besides the object: the configuration of its fields, and the scheme,
+        host and API version of the request in its context. Override it if
+        the serializer uses anything else from its context.
+        """
+        try:
+            return self._variants[serializer]
+        except KeyError:
+            pass
+        parts = [describe_fields(serializer)]
+        request = serializer.context.get('request')
+        if request is not None:
+            parts.extend((request.build_absolute_uri('/'), getattr(request, 'version', None)))
+        variant = hashlib.md5(repr(parts).encode()).hexdigest()
+        self._variants[serializer] = variant
+        return variant
+
+    def get(self, serializer, instance, default=None):
+        # The object's key holds a stamp, replaced when it changes, so that
+        # all its variants are invalidated at once.
+        stamp = self.backend.get(self.get_key(self.get_serializer_key(serializer), instance))
+        representation = self
+        if stamp is not None:
+            representation = self.backend.get(self.get_variant_key(serializer, stamp), self)
+        if representation is self:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return representation
+
+    def set(self, serializer, instance, representation):
+        key = self.get_key(self.get_serializer_key(serializer), instance)
+        stamp = self.backend.get(key)
+        if stamp is None:
+            stamp = uuid4().hex
+            if not self.backend.add(key, stamp, self.timeout):
+                stamp = self.backend.get(key)
+                if stamp is None:
+                    return
+        self.backend.set(self.get_variant_key(serializer, stamp), representation, self.timeout)
+
+    def get_variant_key(self, serializer, stamp):
+        return '%s:%s:%s' % (self.key_prefix, stamp, self.get_variant(serializer))
+
+    def invalidate(self, sender, instance, **kwargs):
+        serializer_keys = self._serializer_keys.get(
+            instance._meta.concrete_model._meta.label_lower)
+        if serializer_keys:
+            self.backend.delete_many([
+                self.get_key(serializer_key, instance) for serializer_key in serializer_keys
+            ])
+
+
+def describe_fields(field):
+    """
+    Return a description of the class, source and nested fields of `field`,
+    to tell serializers apart.
+    """
+    description = [type(field).__module__, type(field).__qualname__, field.source]
+    fields = getattr(field, 'fields', None)
+    if fields is not None:
+        description.append([(name, describe_fields(child)) for name, child in fields.items()])
+    child = getattr(field, 'child', None) or getattr(field, 'child_relation', None)
+    if child is not None:
+        description.append(describe_fields(child))
+    return description
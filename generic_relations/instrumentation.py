@@ -0,0 +1,147 @@
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.db import connections
+
+
+__all__ = ('Measurement', 'add_listener', 'enabled', 'instrument', 'remove_listener',)
+
+
+# The listeners of the whole process, and those of the current context (see
+# `instrument()`).
+listeners = []
+_scoped_listeners = ContextVar('generic_relations_listeners', default=())
+
+_current = ContextVar('generic_relations_measurement', default=None)
+
+
+def enabled():
+    """
+    Return whether anybody listens in the current context. Checked before
+    measuring anything, so that instrumentation is cheap while nobody does.
+    """
+    return bool(listeners or _scoped_listeners.get())
+
+
+def add_listener(listener):
+    """
+    Call `listener` with a `Measurement` every time a generic field or
+    serializer has serialized or deserialized a value.
+    """
+    listeners.append(listener)
+
+
+def remove_listener(listener):
+    listeners.remove(listener)
+
+
+@contextmanager
+def instrument(listener):
+    """
+    Call `listener` with a `Measurement` for every value serialized or
+    deserialized by generic fields and serializers within the block.
+
+    Only the current context is listened to, so other threads, and other
+    requests of an async server, aren't reported. Code run with
+    `sync_to_async()` within the block is.
+    """
+    token = _scoped_listeners.set(_scoped_listeners.get() + (listener,))
+    try:
+        yield listener
+    finally:
+        _scoped_listeners.reset(token)
+
+
+def current():
+    """
+    Return the `Measurement` in progress, if any.
+    """
+    return _current.get()
+
+
+class Measurement(object):
+    """
+    What a generic field or serializer did to serialize (`operation` is
+    `'serialize'`) or deserialize (`'deserialize'`) one value:
+
+    * `field`: the `GenericSerializerMixin` instance.
+    * `serializer` and `model`: the chosen registered serializer and the
+      model it's registered for, or None if none was found.
+    * `candidates` and `failures`: how many registered serializers were
+      tried during deserialization, and how many of them rejected the value.
+    * `duration`, `dispatch_time` and `serialization_time`: the time spent
+      in total, choosing the registered serializer, and in the chosen
+      serializer, in seconds.
+    * `queries`: the number of database queries made, including those made
+      by the chosen serializer.
+
+    Listeners are called when the value is done, even if it was invalid.
+    """
+    def __init__(self, field, operation):
+        self.field = field
+        self.operation = operation
+        self.serializer = None
+        self.candidates = 0
+        self.failures = 0
+        self.duration = 0.0
+        self.serialization_time = 0.0
+        self.queries = 0
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        self._exit_stack = ExitStack()
+        for connection in connections.all():
+            self._exit_stack.enter_context(connection.execute_wrapper(self._count_query))
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.duration = perf_counter() - self._start
+        self._exit_stack.close()
+        _current.reset(self._token)
+        for listener in list(listeners) + list(_scoped_listeners.get()):
+            listener(self)
+
+    @property
+    def dispatch_time(self):
+        return self.duration - self.serialization_time
+
+    @property
+    def model(self):
+        for model, serializer in self.field.serializers.bound_items():
+            if serializer is self.serializer:
+                return model
+        for (model, field_names), serializer in self.field._sparse_serializers.items():
+            if serializer is self.serializer:
+                return model
+        return None
+
+    @contextmanager
+    def serializing(self, serializer):
+        """
+        Count the time spent in the block as spent in `serializer`.
+        """
+        self.serializer = serializer
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.serialization_time += perf_counter() - start
+
+    def tried(self, serializer, duration, failed):
+        """
+        Record that `serializer` was tried for `duration` seconds, and
+        whether it `failed`. Time spent on failed candidates counts as
+        dispatch time.
+        """
+        self.candidates += 1
+        if failed:
+            self.failures += 1
+        else:
+            self.serialization_time += duration
+            self.serializer = serializer
+
+    def _count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
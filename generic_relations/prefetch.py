@@ -0,0 +1,250 @@
+import asyncio
+from collections import OrderedDict, defaultdict
+
+from asgiref.sync import sync_to_async
+
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models.query_utils import DeferredAttribute
+
+from rest_framework import serializers
+
+
+__all__ = (
+    'aget', 'alist', 'aprefetch_generic_foreign_key', 'get_generic_foreign_key',
+    'get_content_type_model', 'get_only_fields', 'get_related_lookups', 'get_values_fields',
+    'prefetch_generic_foreign_key',
+    'represent_values',
+)
+
+
+def get_generic_foreign_key(model, name):
+    """
+    Return the `GenericForeignKey` called `name` on `model`, or None.
+    """
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    if isinstance(field, GenericForeignKey):
+        return field
+    return None
+
+
+def prefetch_generic_foreign_key(instances, field, get_queryset=None):
+    """
+    Load the targets of the `GenericForeignKey` `field` for all `instances`
+    which don't have them cached yet, with one query per content type.
+
+    `get_queryset` may be given to customise the queryset used to fetch
+    the targets of each model. It's called with the model class.
+    """
+    pending, querysets = _get_target_querysets(instances, field, get_queryset)
+    targets = {}
+    for (ct_id, using), queryset in querysets.items():
+        for target in queryset:
+            targets[ct_id, target.pk] = target
+    _set_targets(pending, field, targets)
+
+
+async def aprefetch_generic_foreign_key(instances, field, get_queryset=None):
+    """
+    Like `prefetch_generic_foreign_key()`, but using the async ORM, with the
+    queries for the different content types awaited concurrently.
+    """
+    pending, querysets = await sync_to_async(_get_target_querysets)(instances, field, get_queryset)
+    results = await asyncio.gather(*(alist(queryset) for queryset in querysets.values()))
+    targets = {}
+    for (ct_id, using), result in zip(querysets, results):
+        for target in result:
+            targets[ct_id, target.pk] = target
+    _set_targets(pending, field, targets)
+
+
+async def alist(queryset):
+    """
+    Return the objects of `queryset` as a list, without blocking the event loop.
+    """
+    if hasattr(queryset, '__aiter__'):
+        return [obj async for obj in queryset]
+    # The async ORM was added in Django 4.1.
+    return await sync_to_async(list)(queryset)
+
+
+async def aget(queryset, **kwargs):
+    """
+    Return the object of `queryset` matching `kwargs`, without blocking the
+    event loop.
+    """
+    if hasattr(queryset, 'aget'):
+        return await queryset.aget(**kwargs)
+    return await sync_to_async(queryset.get)(**kwargs)
+
+
+def _get_target_querysets(instances, field, get_queryset):
+    ct_attname = field.model._meta.get_field(field.ct_field).get_attname()
+    pending = []
+    fk_values = defaultdict(set)
+    models = {}
+    for instance in instances:
+        if field.is_cached(instance):
+            continue
+        ct_id = getattr(instance, ct_attname)
+        fk_value = getattr(instance, field.fk_field)
+        model = None
+        if ct_id is not None:
+            model = get_content_type_model(field, ct_id, instance._state.db, models)
+        if model is not None and fk_value is not None:
+            fk_value = model._meta.pk.get_prep_value(fk_value)
+            fk_values[ct_id, model, instance._state.db].add(fk_value)
+        pending.append((instance, ct_id, fk_value if model is not None else None))
+
+    querysets = {}
+    for (ct_id, model, using), values in fk_values.items():
+        if get_queryset is None:
+            queryset = model._base_manager.all()
+        else:
+            queryset = get_queryset(model)
+        querysets[ct_id, using] = queryset.using(using).filter(pk__in=values)
+    return pending, querysets
+
+
+def get_content_type_model(field, ct_id, using, models):
+    """
+    Return the model of the content type with id `ct_id`, as looked up by
+    the `GenericForeignKey` `field`, remembering it in the dict `models`.
+    """
+    try:
+        return models[ct_id, using]
+    except KeyError:
+        model = models[ct_id, using] = field.get_content_type(id=ct_id, using=using).model_class()
+        return model
+
+
+def _set_targets(pending, field, targets):
+    for instance, ct_id, fk_value in pending:
+        field.set_cached_value(instance, targets.get((ct_id, fk_value)))
+
+
+def get_related_lookups(serializer, model):
+    """
+    Return the `select_related()` and `prefetch_related()` lookups needed to
+    represent instances of `model` with `serializer`, as a pair of lists.
+
+    Serializers can declare them with `select_related` and `prefetch_related`
+    attributes on their `Meta`. Otherwise they're inferred from the fields
+    of the serializer which follow relations of the model.
+    """
+    meta = getattr(serializer, 'Meta', None)
+    if hasattr(meta, 'select_related') or hasattr(meta, 'prefetch_related'):
+        return (
+            list(getattr(meta, 'select_related', ())),
+            list(getattr(meta, 'prefetch_related', ())),
+        )
+    select_related, prefetch_related = [], []
+    _infer_related_lookups(serializer, model, '', False, select_related, prefetch_related)
+    return select_related, prefetch_related
+
+
+def _infer_related_lookups(serializer, model, prefix, prefetching, select_related, prefetch_related):
+    fields = getattr(serializer, 'fields', None)
+    if fields is None:
+        return
+    for field in fields.values():
+        if field.write_only or len(field.source_attrs) != 1:
+            continue
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            continue
+        if not model_field.is_relation:
+            continue
+
+        lookup = prefix + field.source
+        if isinstance(model_field, GenericForeignKey):
+            prefetch_related.append(lookup)
+            continue
+
+        child = getattr(field, 'child', None) or getattr(field, 'child_relation', None)
+        if model_field.many_to_many or model_field.one_to_many:
+            prefetch_related.append(lookup)
+            if child is not None:
+                _infer_related_lookups(
+                    child, model_field.related_model, lookup + '__', True,
+                    select_related, prefetch_related)
+        elif (isinstance(field, serializers.BaseSerializer)
+                or not getattr(field, 'use_pk_only_optimization', lambda: False)()):
+            (prefetch_related if prefetching else select_related).append(lookup)
+            _infer_related_lookups(
+                field, model_field.related_model, lookup + '__', prefetching,
+                select_related, prefetch_related)
+
+
+def get_only_fields(serializer, model):
+    """
+    Return the names of the model fields to load with `only()` to represent
+    instances of `model` with `serializer`, or None if it may read anything
+    else, such as properties or methods.
+
+    Relations which aren't columns of `model`, like many-to-many fields,
+    are left to `prefetch_related()`.
+    """
+    names = []
+    for field in serializer._readable_fields:
+        if len(field.source_attrs) != 1:
+            return None
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        if isinstance(model_field, GenericForeignKey):
+            names.extend((model_field.ct_field, model_field.fk_field))
+        elif model_field.concrete:
+            names.append(model_field.name)
+        elif not model_field.is_relation:
+            return None
+    return names
+
+
+def get_values_fields(serializer, model):
+    """
+    Return the fields of `serializer` if it can represent instances of
+    `model` from the rows of `values()`, or None.
+
+    That's a `ModelSerializer` without a custom `to_representation()`, all of
+    whose fields read the value of a concrete, non-relational model field.
+    Serializers with method fields, properties or nested serializers need
+    model instances.
+    """
+    if (not isinstance(serializer, serializers.ModelSerializer)
+            or type(serializer).to_representation is not serializers.Serializer.to_representation):
+        return None
+    fields = []
+    for field in serializer._readable_fields:
+        if (len(field.source_attrs) != 1
+                or type(field).get_attribute is not serializers.Field.get_attribute):
+            return None
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        # File fields, for instance, give instances a different value than
+        # the one stored.
+        descriptor_class = getattr(model_field, 'descriptor_class', DeferredAttribute)
+        if (not model_field.concrete or model_field.is_relation
+                or descriptor_class is not DeferredAttribute):
+            return None
+        fields.append(field)
+    return fields
+
+
+def represent_values(fields, row):
+    """
+    Return the representation of the `values()` row `row` by the serializer
+    `fields` (see `get_values_fields()`) belong to.
+    """
+    representation = OrderedDict()
+    for field in fields:
+        value = row[field.source]
+        representation[field.field_name] = None if value is None else field.to_representation(value)
+    return representation
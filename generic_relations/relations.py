@@ -1,11 +1,45 @@
+import asyncio
+import logging
+import warnings
+from collections import defaultdict
+from collections.abc import Mapping
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib.contenttypes.fields import GenericRelation
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ImproperlyConfigured
+from django.db import router, transaction
+from django.db.models import Manager, Model
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.query import QuerySet
 from django.utils.deprecation import RenameMethodsBase
+from django.utils.translation import gettext_lazy as _
 
 from rest_framework import serializers
+from rest_framework.fields import empty
+from rest_framework.relations import PKOnlyObject
+from rest_framework.serializers import raise_errors_on_nested_writes
+from rest_framework.utils import html
+
+from .prefetch import (
+    alist, aprefetch_generic_foreign_key, get_generic_foreign_key,
+    get_content_type_model, get_only_fields, get_related_lookups, get_values_fields,
+    prefetch_generic_foreign_key, represent_values,
+)
+from .serializers import INCLUDED_CONTEXT_KEY, GenericSerializerMixin, iter_chunks
+
+
+__all__ = (
+    'GenericRelatedField', 'GenericRelatedListSerializer', 'GenericPKOnlyObject',
+    'GenericRelationSerializer', 'PrefetchedRepresentation', 'WritableGenericRelationsMixin',
+)
 
-from .serializers import GenericSerializerMixin
 
+LAZY_LOAD_ACTIONS = (None, 'warn', 'log', 'raise')
 
-__all__ = ('GenericRelatedField',)
+logger = logging.getLogger('generic_relations')
 
 
 class RenamedMethods(RenameMethodsBase):
@@ -15,9 +49,587 @@ class RenamedMethods(RenameMethodsBase):
     )
 
 
+class GenericPKOnlyObject(PKOnlyObject):
+    """
+    A `PKOnlyObject` which also knows the model of the object it stands for.
+    """
+    def __init__(self, model, pk):
+        super(GenericPKOnlyObject, self).__init__(pk)
+        self.model = model
+
+
+class PrefetchedRepresentation(object):
+    """
+    The representation of a generic foreign key target, produced from its
+    prefetched values rather than from a model instance.
+    """
+    def __init__(self, model, pk, representation):
+        self.model = model
+        self.pk = pk
+        self.representation = representation
+
+
 class GenericRelatedField(GenericSerializerMixin, serializers.Field, metaclass=RenamedMethods):
     """
     Represents a generic relation / foreign key.
     It's actually more of a wrapper, that delegates the logic to registered
     serializers based on the `Model` class.
+
+    With `pk_only_targets=True`, targets whose registered serializer only
+    needs their primary key, like a `HyperlinkedRelatedField`, are
+    represented straight from the content type and object id columns,
+    without being loaded. Their existence isn't checked then: a dangling
+    generic foreign key is represented like any other, rather than as None.
+
+    When serializing a list of objects whose generic foreign key targets
+    haven't been prefetched, the targets of the whole list are loaded
+    with one query per content type, along with the related objects their
+    serializers need (see `get_target_queryset`). Pass
+    `prefetch_targets=False` to disable this. Targets whose serializer only
+    reads plain model fields are represented straight from `values()` rows
+    instead (see `get_values_fields`).
+
+    To find lists whose targets are still loaded one at a time, set
+    `lazy_load` (by default, the `GENERIC_RELATIONS_LAZY_LOAD` setting)
+    to `'warn'`, `'log'` or `'raise'`.
+
+    With `pointers=True`, targets of the items of a list are represented by
+    `{"type": ..., "id": ...}` pointers, and each distinct target is
+    serialized once into the `included` targets of the serializer run (see
+    `get_included`). Outside lists, targets are represented in full.
     """
+    def __init__(self, serializers, *args, **kwargs):
+        self.prefetch_targets = kwargs.pop('prefetch_targets', True)
+        self.pk_only_targets = kwargs.pop('pk_only_targets', False)
+        self.pointers = kwargs.pop('pointers', False)
+        self.lazy_load = kwargs.pop('lazy_load', empty)
+        if self.lazy_load not in LAZY_LOAD_ACTIONS + (empty,):
+            raise ImproperlyConfigured(
+                'lazy_load must be one of %r, not %r.' % (LAZY_LOAD_ACTIONS, self.lazy_load))
+        super(GenericRelatedField, self).__init__(serializers, *args, **kwargs)
+        self._values_fields = {}
+        self._representations = {}
+
+    def get_attribute(self, instance):
+        field = self.get_source_generic_foreign_key(instance)
+        if field is not None:
+            ct_id = getattr(instance, field.model._meta.get_field(field.ct_field).get_attname())
+            if ct_id is None:
+                return None
+            model = self.get_pk_only_model(field, ct_id, instance._state.db)
+            if model is not None:
+                pk = model._meta.pk.to_python(getattr(instance, field.fk_field))
+                return GenericPKOnlyObject(model, pk)
+        if self.prefetch_targets:
+            representation = self.get_prefetched_representation(field, instance)
+            if representation is None:
+                self.prefetch_list_targets(instance)
+                representation = self.get_prefetched_representation(field, instance)
+            if representation is not None:
+                return representation
+        if field is not None:
+            self.check_lazy_load(field, instance)
+        return super(GenericRelatedField, self).get_attribute(instance)
+
+    def to_representation(self, instance):
+        if self.pointers and isinstance(getattr(self.parent, 'parent', None), serializers.ListSerializer):
+            return self.to_pointer(instance)
+        if isinstance(instance, PrefetchedRepresentation):
+            return instance.representation
+        return super(GenericRelatedField, self).to_representation(instance)
+
+    def to_pointer(self, instance):
+        """
+        Return the `{"type": ..., "id": ...}` pointer to `instance`, after
+        adding its representation to the included targets, unless it's
+        already there. The included targets are keyed by type and id only,
+        so a target pointed to by several fields is represented by the
+        serializer of the first one.
+        """
+        if isinstance(instance, (GenericPKOnlyObject, PrefetchedRepresentation)):
+            model = instance.model
+        else:
+            model = type(instance)
+        pointer = {
+            'type': self.get_model_type(self.get_registered_model(model)),
+            'id': instance.pk,
+        }
+        included = self.get_included()
+        key = (pointer['type'], pointer['id'])
+        if key not in included:
+            if isinstance(instance, PrefetchedRepresentation):
+                attributes = instance.representation
+            else:
+                attributes = super(GenericRelatedField, self).to_representation(instance)
+            included[key] = dict(pointer, attributes=attributes)
+        return pointer
+
+    def get_included(self):
+        """
+        Return the targets included so far in this serializer run (usually
+        one request), as a dict of `{"type": ..., "id": ..., "attributes": ...}`
+        representations by type and id. It's kept in the serializer context,
+        and shared by all the generic fields using pointers.
+        """
+        return self.context.setdefault(INCLUDED_CONTEXT_KEY, {})
+
+    def check_lazy_load(self, field, instance):
+        """
+        Warn, log or raise, according to `lazy_load`, if the target of
+        `instance` is about to be loaded on its own while serializing a list.
+        """
+        action = self.lazy_load
+        if action is empty:
+            action = getattr(settings, 'GENERIC_RELATIONS_LAZY_LOAD', None)
+        if action is None or field.is_cached(instance) or getattr(instance, field.fk_field) is None:
+            return
+        if not isinstance(getattr(self.parent, 'parent', None), serializers.ListSerializer):
+            return
+        msg = (
+            'The %s target of %r is loaded lazily while serializing a list, '
+            'with one query per item. Prefetch it with prefetch_related(%r).' % (
+                field.name, instance, field.name))
+        if action == 'raise':
+            raise RuntimeError(msg)
+        if action == 'warn':
+            warnings.warn(msg, RuntimeWarning, stacklevel=2)
+        else:
+            logger.warning(msg)
+
+    def get_serializer_for_instance(self, instance):
+        if isinstance(instance, (GenericPKOnlyObject, PrefetchedRepresentation)):
+            return self.get_representation_serializer(instance.model)
+        return super(GenericRelatedField, self).get_serializer_for_instance(instance)
+
+    def prepare(self):
+        super(GenericRelatedField, self).prepare()
+        for model in self.serializers:
+            self.get_target_queryset(model)
+
+    def get_source_generic_foreign_key(self, instance):
+        """
+        Return the `GenericForeignKey` this field is the source of, if any.
+        """
+        if len(self.source_attrs) != 1 or not isinstance(instance, Model):
+            return None
+        return get_generic_foreign_key(type(instance), self.source_attrs[0])
+
+    def get_pk_only_model(self, field, ct_id, using):
+        """
+        Return the model of the content type with id `ct_id` if the serializer
+        registered for it only needs the primary key of its objects, such as
+        a `HyperlinkedRelatedField`, and `pk_only_targets` is set. Otherwise
+        return None.
+        """
+        if not self.pk_only_targets:
+            return None
+        try:
+            return self.registry.pk_only_models[ct_id, using]
+        except KeyError:
+            pass
+        model = field.get_content_type(id=ct_id, using=using).model_class()
+        try:
+            serializer = self.get_serializer_for_model(model)
+        except serializers.ValidationError:
+            serializer = None
+        if not getattr(serializer, 'use_pk_only_optimization', lambda: False)():
+            model = None
+        self.registry.pk_only_models[ct_id, using] = model
+        return model
+
+    def prefetch_list_targets(self, instance):
+        """
+        If `instance` is being serialized as part of a list, and its generic
+        foreign key target isn't loaded yet, load the targets of the list.
+        """
+        field = self.get_source_generic_foreign_key(instance)
+        if field is None or field.is_cached(instance):
+            return
+        instances = self.get_list_instances()
+        if instances is not None:
+            self.prefetch_instance_targets(instances)
+
+    def prefetch_instance_targets(self, instances):
+        """
+        Load the generic foreign key targets of all `instances` with one query
+        per content type, except those represented by primary key only.
+        """
+        field, instances = self.get_prefetchable_instances(instances)
+        if field is not None:
+            instances = self.prefetch_target_representations(field, instances)
+            prefetch_generic_foreign_key(instances, field, get_queryset=self.get_target_queryset)
+
+    def prefetch_target_representations(self, field, instances):
+        """
+        Represent the targets of `instances` whose serializer can do without
+        model instances straight from their `values()`, with one query per
+        content type. Return the other instances.
+        """
+        self._representations = {}
+        ct_attname = field.model._meta.get_field(field.ct_field).get_attname()
+        remaining, pending = [], []
+        fk_values = defaultdict(set)
+        for instance in instances:
+            ct_id = getattr(instance, ct_attname)
+            fk_value = getattr(instance, field.fk_field)
+            model = get_content_type_model(field, ct_id, instance._state.db, self.registry.target_models)
+            if (fk_value is None or model is None or field.is_cached(instance)
+                    or self.get_values_fields(model) is None):
+                remaining.append(instance)
+                continue
+            fk_value = model._meta.pk.get_prep_value(fk_value)
+            fk_values[ct_id, model, instance._state.db].add(fk_value)
+            pending.append((instance, ct_id, fk_value))
+
+        for (ct_id, model, using), values in fk_values.items():
+            fields = self.get_values_fields(model)
+            rows = self.get_target_queryset(model).using(using).filter(pk__in=values).values(
+                'pk', *{field.source for field in fields})
+            for row in rows:
+                self._representations[ct_id, row['pk']] = PrefetchedRepresentation(
+                    model, row['pk'], represent_values(fields, row))
+
+        for instance, ct_id, fk_value in pending:
+            if (ct_id, fk_value) not in self._representations:
+                field.set_cached_value(instance, None)
+        return remaining
+
+    def get_prefetched_representation(self, field, instance):
+        """
+        Return the representation of the target of `instance` produced by
+        `prefetch_target_representations()`, if any.
+        """
+        if field is None or not self._representations:
+            return None
+        ct_id = getattr(instance, field.model._meta.get_field(field.ct_field).get_attname())
+        model = get_content_type_model(field, ct_id, instance._state.db, self.registry.target_models)
+        if model is None:
+            return None
+        fk_value = model._meta.pk.get_prep_value(getattr(instance, field.fk_field))
+        return self._representations.get((ct_id, fk_value))
+
+    def get_values_fields(self, model):
+        """
+        Return the fields of the serializer registered for `model`, if it can
+        represent its instances from `values()` rows (see
+        `prefetch.get_values_fields()`). Otherwise return None.
+
+        Rows are never used by subclasses customising
+        `get_serializer_for_instance()` or `to_representation()`, which expect
+        model instances.
+        """
+        try:
+            return self._values_fields[model]
+        except KeyError:
+            pass
+        fields = None
+        if not self._overrides_representation():
+            try:
+                serializer = self.get_representation_serializer(model)
+            except serializers.ValidationError:
+                pass
+            else:
+                fields = get_values_fields(serializer, model)
+        self._values_fields[model] = fields
+        return fields
+
+    def _overrides_representation(self):
+        return (
+            type(self).get_serializer_for_instance is not GenericRelatedField.get_serializer_for_instance
+            or type(self).to_representation is not GenericRelatedField.to_representation
+        )
+
+    async def aprefetch_instance_targets(self, instances):
+        """
+        Like `prefetch_instance_targets()`, but using the async ORM.
+        """
+        field, instances = await sync_to_async(self.get_prefetchable_instances)(instances)
+        if field is not None:
+            await aprefetch_generic_foreign_key(
+                instances, field, get_queryset=self.get_target_queryset)
+
+    def get_prefetchable_instances(self, instances):
+        """
+        Return the `GenericForeignKey` this field is the source of and those of
+        `instances` whose targets should be prefetched.
+        """
+        instances = [obj for obj in instances if isinstance(obj, Model)]
+        field = self.get_source_generic_foreign_key(instances[0]) if instances else None
+        if field is None:
+            return None, []
+        ct_attname = field.model._meta.get_field(field.ct_field).get_attname()
+        return field, [
+            obj for obj in instances
+            if isinstance(obj, field.model) and getattr(obj, ct_attname) is not None
+            and self.get_pk_only_model(field, getattr(obj, ct_attname), obj._state.db) is None
+        ]
+
+    def get_target_queryset(self, model):
+        """
+        Return the queryset used to prefetch targets of type `model`, with the
+        related objects needed by the serializer registered for it. With a
+        fieldset, only the columns its fields need are loaded.
+        """
+        queryset = model._base_manager.all()
+        try:
+            serializer = self.get_representation_serializer(model)
+        except serializers.ValidationError:
+            return queryset
+        sparse = serializer is not self.get_serializer_for_model(model)
+        key = (model, type(serializer)) if sparse else model
+        if key not in self.registry.related_lookups:
+            self.registry.related_lookups[key] = get_related_lookups(serializer, model)
+        select_related, prefetch_related = self.registry.related_lookups[key]
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        if sparse:
+            only = get_only_fields(serializer, model)
+            if only is not None:
+                # Relations loaded with select_related() can't be deferred.
+                only.extend(lookup.split(LOOKUP_SEP)[0] for lookup in select_related)
+                queryset = queryset.only(*only)
+        return queryset
+
+    def get_list_instances(self):
+        """
+        Return the instances of the list this field's parent belongs to,
+        if they have already been loaded.
+        """
+        list_serializer = getattr(self.parent, 'parent', None)
+        if not isinstance(list_serializer, serializers.ListSerializer):
+            return None
+        instances = list_serializer.instance
+        if isinstance(instances, QuerySet):
+            # Never evaluate the queryset here; `ListSerializer` already has.
+            instances = instances._result_cache
+        if isinstance(instances, (list, tuple)):
+            return instances
+        return None
+
+
+class GenericRelatedListSerializer(serializers.ListSerializer):
+    """
+    A `ListSerializer` for serializers with `GenericRelatedField`s.
+    Use it as the `list_serializer_class` of such a serializer to look up
+    hyperlinked generic targets with one query per model, rather than one
+    query per item, and to stream representations with
+    `iter_representation()`.
+    """
+    def get_generic_related_fields(self):
+        return [
+            field for field in self.child.fields.values()
+            if isinstance(field, GenericRelatedField)
+        ]
+
+    @property
+    def included(self):
+        """
+        The targets of generic fields with `pointers=True`, each serialized
+        once, in the order they were first pointed to. It's complete once
+        the items have been serialized.
+        """
+        return list(self.context.get(INCLUDED_CONTEXT_KEY, {}).values())
+
+    def iter_representation(self, data=None, chunk_size=2000):
+        """
+        Yield the representations of `data` (by default, the instance of the
+        serializer) one at a time, so that they needn't all be held in memory.
+
+        Querysets are read `chunk_size` rows at a time, and the generic foreign
+        key targets of each chunk are prefetched together.
+        """
+        if data is None:
+            data = self.instance
+        fields = [
+            field for field in self.get_generic_related_fields()
+            if not field.write_only and field.prefetch_targets
+        ]
+        for chunk in iter_chunks(data, chunk_size):
+            for field in fields:
+                field.prefetch_instance_targets(chunk)
+            for item in chunk:
+                yield self.child.to_representation(item)
+
+    async def ato_representation(self, data=None):
+        """
+        Return the representations of `data` (by default, the instance of the
+        serializer) without blocking the event loop.
+
+        The generic foreign key targets of all the items are prefetched with
+        the async ORM, with the queries of the different fields awaited
+        concurrently.
+        """
+        if data is None:
+            data = self.instance
+        if isinstance(data, Manager):
+            data = data.all()
+        items = await alist(data) if isinstance(data, QuerySet) else list(data)
+        fields = [
+            field for field in self.get_generic_related_fields()
+            if not field.write_only and field.prefetch_targets
+        ]
+        await asyncio.gather(*(field.aprefetch_instance_targets(items) for field in fields))
+        return await sync_to_async(self.to_representation)(items)
+
+    def to_internal_value(self, data):
+        if html.is_html_input(data) or not isinstance(data, list):
+            return super(GenericRelatedListSerializer, self).to_internal_value(data)
+
+        fields = [field for field in self.get_generic_related_fields() if not field.read_only]
+        for field in fields:
+            values = (
+                field.get_value(item) for item in data if isinstance(item, Mapping)
+            )
+            field.prefetch_hyperlinked_targets(value for value in values if value is not empty)
+        try:
+            return super(GenericRelatedListSerializer, self).to_internal_value(data)
+        finally:
+            for field in fields:
+                field.clear_prefetched_targets()
+
+
+class GenericRelationSerializer(serializers.ListSerializer):
+    """
+    A writable `ListSerializer` for a reverse `GenericRelation`, such as the
+    tags of a bookmark. The `child` serializes the related model; submitted
+    items are matched with the existing related objects by their `key` field,
+    and the others are new. If `key` is the primary key, items with a key
+    matching none of the existing objects are invalid; primary keys are
+    never taken from the data otherwise.
+
+    The parent serializer needs `WritableGenericRelationsMixin`.
+    """
+    default_error_messages = {
+        'duplicate_key': _('Duplicate {field} {value!r}.'),
+        'unknown_key': _('No related object with {field} {value!r}.'),
+    }
+
+    def __init__(self, *args, **kwargs):
+        self.key = kwargs.pop('key')
+        super(GenericRelationSerializer, self).__init__(*args, **kwargs)
+
+    def to_internal_value(self, data):
+        value = super(GenericRelationSerializer, self).to_internal_value(data)
+        keys = set()
+        for attrs in value:
+            key = attrs.get(self.key)
+            if key is None:
+                continue
+            if key in keys:
+                self.fail('duplicate_key', field=self.key, value=key)
+            keys.add(key)
+        return value
+
+    def get_generic_relation(self, instance):
+        field = instance._meta.get_field(self.source)
+        if not isinstance(field, GenericRelation):
+            raise ImproperlyConfigured(
+                '%s.%s is not a GenericRelation.' % (instance._meta.label, self.source))
+        return field
+
+    def sync(self, instance, validated_data):
+        """
+        Make the objects related to `instance` match `validated_data`:
+        update the existing objects whose key was submitted, create the
+        others, and delete the existing objects whose key wasn't. Of existing
+        objects sharing a key, only the first is kept. This takes
+        a query to read the existing objects, then at most one
+        `bulk_create()`, one `bulk_update()` and one `delete()`.
+
+        Return the related objects, in the order they were submitted.
+        """
+        field = self.get_generic_relation(instance)
+        model = field.related_model
+        pk_names = {model._meta.pk.name, model._meta.pk.attname}
+        using = router.db_for_write(model, instance=instance)
+        content_type = ContentType.objects.db_manager(using).get_for_model(
+            instance, for_concrete_model=field.for_concrete_model)
+
+        # Keys needn't be unique, so existing objects are grouped by key.
+        existing = defaultdict(list)
+        for obj in model._default_manager.using(using).filter(**{
+            field.content_type_field_name: content_type,
+            field.object_id_field_name: instance.pk,
+        }).order_by('pk'):
+            existing[getattr(obj, self.key)].append(obj)
+        if self.key in pk_names:
+            for attrs in validated_data:
+                key = attrs.get(self.key)
+                if key is not None and key not in existing:
+                    raise serializers.ValidationError({self.field_name: [
+                        self.error_messages['unknown_key'].format(field=self.key, value=key),
+                    ]})
+
+        objects = []
+        created = []
+        updated = []
+        updated_fields = set()
+        for attrs in validated_data:
+            matches = existing.get(attrs.get(self.key))
+            obj = matches.pop(0) if matches else None
+            attrs = {name: value for name, value in attrs.items() if name not in pk_names}
+            if obj is None:
+                raise_errors_on_nested_writes('create', self.child, attrs)
+                obj = model(**attrs)
+                setattr(obj, field.content_type_field_name, content_type)
+                setattr(obj, field.object_id_field_name, instance.pk)
+                created.append(obj)
+            else:
+                raise_errors_on_nested_writes('update', self.child, attrs)
+                changed = [name for name, value in attrs.items() if getattr(obj, name) != value]
+                for name in changed:
+                    setattr(obj, name, attrs[name])
+                if changed:
+                    updated.append(obj)
+                    updated_fields.update(changed)
+            objects.append(obj)
+
+        if created:
+            model._default_manager.using(using).bulk_create(created)
+        if updated:
+            model._default_manager.using(using).bulk_update(updated, sorted(updated_fields))
+        deleted = [obj.pk for matches in existing.values() for obj in matches]
+        if deleted:
+            model._default_manager.using(using).filter(pk__in=deleted).delete()
+
+        # The prefetched objects, if any, are stale.
+        getattr(instance, '_prefetched_objects_cache', {}).pop(field.name, None)
+        return objects
+
+
+class WritableGenericRelationsMixin(object):
+    """
+    A `ModelSerializer` mixin which saves the reverse generic relations
+    declared with `GenericRelationSerializer`, after creating or updating
+    the instance.
+    """
+    def get_generic_relation_serializers(self):
+        return [
+            field for field in self._writable_fields
+            if isinstance(field, GenericRelationSerializer)
+        ]
+
+    def pop_generic_relations(self, validated_data):
+        return [
+            (field, validated_data.pop(field.source))
+            for field in self.get_generic_relation_serializers()
+            if field.source in validated_data
+        ]
+
+    def create(self, validated_data):
+        relations = self.pop_generic_relations(validated_data)
+        with transaction.atomic(using=router.db_for_write(self.Meta.model)):
+            instance = super(WritableGenericRelationsMixin, self).create(validated_data)
+            for field, data in relations:
+                field.sync(instance, data)
+        return instance
+
+    def update(self, instance, validated_data):
+        relations = self.pop_generic_relations(validated_data)
+        with transaction.atomic(using=router.db_for_write(type(instance), instance=instance)):
+            instance = super(WritableGenericRelationsMixin, self).update(instance, validated_data)
+            for field, data in relations:
+                field.sync(instance, data)
+        return instance
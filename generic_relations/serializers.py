@@ -1,12 +1,286 @@
-from django.core.exceptions import ImproperlyConfigured
+import asyncio
+import copy
+from collections.abc import Mapping, MutableMapping
+from contextlib import nullcontext
+from itertools import islice
+from time import perf_counter
+from urllib import parse
+from weakref import WeakSet
+
+from asgiref.sync import sync_to_async
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import DatabaseError, connections, router
+from django.db.models import Manager, Model
+from django.db.models.query import QuerySet
+from django.urls import Resolver404, get_script_prefix, resolve
+from django.utils.encoding import uri_to_iri
+from django.utils.module_loading import import_string
 from django.utils.translation import gettext_lazy as _
 from django import forms
 
 from rest_framework import serializers
+from rest_framework.fields import Field, empty
+from rest_framework.serializers import raise_errors_on_nested_writes
 from rest_framework.settings import api_settings
+from rest_framework.utils import model_meta
+
+from . import instrumentation
+from .cache import RepresentationMemo
+from .prefetch import aget, alist
+
+
+__all__ = ('GenericSerializerMixin', 'GenericModelSerializer', 'GenericModelListSerializer',)
+
+
+MEMO_CONTEXT_KEY = '_generic_relations_memos'
+INCLUDED_CONTEXT_KEY = '_generic_relations_included'
+
+# The generic fields and serializers created with their serializers, rather
+# than copied, for `prepare_fields()`.
+originals = WeakSet()
+
+
+def prepare_fields(warm_content_types=False):
+    """
+    Prepare all the generic fields and serializers created so far (see
+    `GenericSerializerMixin.prepare()`). With `warm_content_types`, also
+    load the content types of their models, if the database is available.
+    """
+    fields = list(originals)
+    for field in fields:
+        field.prepare()
+    if warm_content_types:
+        models = {model for field in fields for model in field.serializers}
+        try:
+            ContentType.objects.get_for_models(*models)
+        except DatabaseError:
+            pass
+
+
+def iter_chunks(data, chunk_size):
+    """
+    Yield lists of up to `chunk_size` items of `data`. Querysets are iterated
+    without caching their results.
+    """
+    if isinstance(data, Manager):
+        data = data.all()
+    if isinstance(data, QuerySet):
+        iterator = data.iterator(chunk_size=chunk_size)
+    else:
+        iterator = iter(data)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _reads_own_key(field):
+    # DRF's fields get their value from the key named after them, but custom
+    # ones might get it from anywhere.
+    return type(field).get_value.__module__.startswith('rest_framework.')
+
+
+class SerializerRegistry(object):
+    """
+    The registered serializers of a generic field, and what's derived from
+    them to choose one. It's shared by all the copies of the field, so
+    copying a field doesn't copy its serializers.
+
+    Models may be given as "app_label.ModelName" strings, and serializers as
+    classes or dotted paths to classes. They're only resolved when needed.
+    """
+    def __init__(self, serializers):
+        self.declared = serializers
+        self._serializers = None
+        self._classes = {}
+        self.models_by_type = empty
+        self.models_by_view_name = empty
+        self.models_by_class = {}
+        self.pk_only_models = {}
+        self.related_lookups = {}
+        self.target_models = {}
+        self._candidate_order = None
+        self._matches = {}
+        self._sparse_classes = {}
+
+    def __deepcopy__(self, memo):
+        return self
+
+    @property
+    def serializers(self):
+        """
+        The registered serializers (or their classes, or paths), by model.
+        """
+        if self._serializers is None:
+            self._serializers = {
+                apps.get_model(model) if isinstance(model, str) else model: serializer
+                for model, serializer in self.declared.items()
+            }
+        return self._serializers
+
+    def is_resolved(self):
+        """
+        Return whether all the models and serializers were given as such.
+        """
+        return all(
+            not isinstance(model, str) and isinstance(serializer, serializers.Field)
+            for model, serializer in self.declared.items()
+        )
+
+    def get_candidate_order(self):
+        """
+        Return the models in the order their serializers should be tried in
+        by first-match resolution: the most often matched first.
+        """
+        if self._candidate_order is None:
+            self._candidate_order = tuple(self.serializers)
+        return self._candidate_order
+
+    def record_match(self, model):
+        """
+        Count a match of the serializer for `model`, and move it up one place
+        in the candidate order if it's now matched more often than the one
+        before it.
+        """
+        order = self.get_candidate_order()
+        index = order.index(model)
+        matches = self._matches[model] = self._matches.get(model, 0) + 1
+        if index and matches > self._matches.get(order[index - 1], 0):
+            # Replaced rather than modified, so that concurrent lookups
+            # never see a model twice.
+            order = list(order)
+            order[index - 1], order[index] = order[index], order[index - 1]
+            self._candidate_order = tuple(order)
+
+    def get_sparse_class(self, serializer_class, field_names):
+        """
+        Return a subclass of `serializer_class` which only builds the fields
+        named in `field_names`.
+        """
+        key = (serializer_class, field_names)
+        try:
+            return self._sparse_classes[key]
+        except KeyError:
+            pass
+
+        if issubclass(serializer_class, serializers.ModelSerializer):
+            def get_field_names(self, declared_fields, info):
+                names = super(sparse_class, self).get_field_names(declared_fields, info)
+                return [name for name in names if name in field_names]
+            attrs = {'get_field_names': get_field_names}
+        else:
+            def get_fields(self):
+                fields = super(sparse_class, self).get_fields()
+                for name in list(fields):
+                    if name not in field_names:
+                        del fields[name]
+                return fields
+            attrs = {'get_fields': get_fields}
+        attrs.update(
+            __module__=serializer_class.__module__,
+            __qualname__=serializer_class.__qualname__,
+            sparse_field_names=field_names,
+        )
+        sparse_class = type(serializer_class.__name__, (serializer_class,), attrs)
+        self._sparse_classes[key] = sparse_class
+        return sparse_class
+
+    def get_serializer_class(self, model):
+        serializer = self.serializers[model]
+        if isinstance(serializer, serializers.Field):
+            return type(serializer)
+        if isinstance(serializer, str):
+            try:
+                return self._classes[model]
+            except KeyError:
+                serializer = self._classes[model] = import_string(serializer)
+        return serializer
+
+    def get_serializer(self, model, parent):
+        """
+        Return the serializer registered for `model`, bound to `parent`.
+        """
+        serializer = self.serializers[model]
+        if isinstance(serializer, serializers.Field):
+            if getattr(serializer, 'parent', None) is parent:
+                return serializer
+            serializer = copy.deepcopy(serializer)
+        else:
+            serializer = self.get_serializer_class(model)()
+        serializer.bind('', parent)
+        return serializer
+
+
+class BoundSerializers(MutableMapping):
+    """
+    The registered serializers of a generic field, bound to it. They're
+    created the first time they're looked up.
+
+    Changing them gives the field a registry of its own, so that the copies
+    of the field made before keep their serializers, as with a dict.
+    """
+    def __init__(self, registry, parent):
+        self.registry = registry
+        self.parent = parent
+        self._bound = {}
+
+    def __getitem__(self, model):
+        try:
+            return self._bound[model]
+        except KeyError:
+            pass
+        serializer = self._bound[model] = self.registry.get_serializer(model, self.parent)
+        return serializer
+
+    def __setitem__(self, model, serializer):
+        if isinstance(model, str):
+            model = apps.get_model(model)
+        self.parent._bind_serializer(serializer)
+        serializers = dict(self.registry.serializers)
+        serializers[model] = serializer
+        self._set_serializers(serializers)
+
+    def __delitem__(self, model):
+        if isinstance(model, str):
+            model = apps.get_model(model)
+        serializers = dict(self.registry.serializers)
+        del serializers[model]
+        self._set_serializers(serializers)
+
+    def _set_serializers(self, serializers):
+        self.parent._set_registry(SerializerRegistry(serializers))
+        # The field keeps this mapping, so that further changes through it
+        # add up.
+        self.registry = self.parent.registry
+        self._bound = {}
+        self.parent.serializers = self
+
+    def __contains__(self, model):
+        return model in self.registry.serializers
+
+    def __iter__(self):
+        return iter(self.registry.serializers)
+
+    def __len__(self):
+        return len(self.registry.serializers)
 
+    def bound_items(self):
+        """
+        Return the (model, serializer) pairs of the serializers bound so far.
+        """
+        return self._bound.items()
 
-__all__ = ('GenericSerializerMixin', 'GenericModelSerializer',)
+    def bind_all(self):
+        """
+        Create and bind all the registered serializers now, rather than when
+        they're first looked up.
+        """
+        for model in self:
+            self[model]
 
 
 class GenericSerializerMixin(object):
@@ -23,58 +297,757 @@ class GenericSerializerMixin(object):
         """
         Needs an extra parameter `serializers` which has to be a dict
         key: value being `Model`: serializer.
+
+        Models may also be given as "app_label.ModelName" strings, and
+        serializers as classes or dotted paths to classes, which are only
+        imported and instantiated when first needed.
+
+        Pass `memo_size` to remember up to that many representations of
+        model instances for the rest of the serializer run (usually one
+        request), so that an object appearing many times is only serialized
+        once. To keep them across requests, pass a `RepresentationCache` as
+        `cache`.
+
+        By default, deserialization tries every registered serializer, and
+        fails unless exactly one accepts the data. With
+        `resolution='first-match'`, the first to accept it is used; they're
+        tried in order of how often they matched before.
+
+        An optional `discriminator` switches deserialization from trying
+        every registered serializer to a direct lookup. It is either the
+        name of a key in the incoming data holding the model type (see
+        `get_model_type`), or a callable taking the data and returning it.
         """
+        self.discriminator = kwargs.pop('discriminator', None)
+        self.resolution = kwargs.pop('resolution', 'strict')
+        if self.resolution not in ('strict', 'first-match'):
+            raise ImproperlyConfigured(
+                "resolution must be 'strict' or 'first-match', not %r." % self.resolution)
+        self.memo_size = kwargs.pop('memo_size', None)
+        self.cache = kwargs.pop('cache', None)
         super(GenericSerializerMixin, self).__init__(*args, **kwargs)
-        self.serializers = serializers
-        for serializer in self.serializers.values():
-            if serializer.source is not None:
-                msg = '{}() cannot be re-used. Create a new instance.'
-                raise RuntimeError(msg.format(type(serializer).__name__))
-            serializer.bind('', self)
+        self._prefetched_targets = {}
+        self._required_keys = {}
+        self._fieldsets = None
+        self._sparse_serializers = {}
+
+        if isinstance(serializers, SerializerRegistry):
+            # A copy of a field: share the registry of the original, and only
+            # copy the serializers actually used.
+            self.registry = serializers
+            self.serializers = BoundSerializers(self.registry, self)
+            return
+
+        for serializer in serializers.values():
+            self._bind_serializer(serializer)
+        self._set_registry(SerializerRegistry(serializers))
+
+    def _bind_serializer(self, serializer):
+        if not isinstance(serializer, Field):
+            return
+        if serializer.source is not None:
+            msg = '{}() cannot be re-used. Create a new instance.'
+            raise RuntimeError(msg.format(type(serializer).__name__))
+        serializer.bind('', self)
+
+    def _set_registry(self, registry):
+        self.registry = registry
+        self.serializers = BoundSerializers(self.registry, self)
+        self._required_keys = {}
+        self._sparse_serializers = {}
+        if self.cache is not None:
+            # Representations must be invalidated even by processes which
+            # haven't used the serializer yet.
+            for model in self.registry.serializers:
+                self.cache.register(model, self.registry.get_serializer_class(model))
+        if self.registry.is_resolved():
+            # Report configuration errors straight away.
+            self.build_model_maps()
+        # Copies of the field are given the registry instead of the serializers.
+        if 'serializers' in self._kwargs:
+            self._kwargs = dict(self._kwargs, serializers=self.registry)
+        else:
+            self._args = (self.registry,) + tuple(self._args[1:])
+        originals.add(self)
+
+    def build_model_maps(self):
+        """
+        Build the maps from model types and view names to models now, rather
+        than when first deserializing, raising any configuration error.
+        """
+        if self.discriminator is not None and self.registry.models_by_type is empty:
+            self.registry.models_by_type = self.get_models_by_type()
+        if self.registry.models_by_view_name is empty:
+            self.registry.models_by_view_name = self.get_models_by_view_name()
+
+    @property
+    def models_by_type(self):
+        if self.discriminator is None:
+            return None
+        if self.registry.models_by_type is empty:
+            self.registry.models_by_type = self.get_models_by_type()
+        return self.registry.models_by_type
+
+    @property
+    def models_by_view_name(self):
+        if self.registry.models_by_view_name is empty:
+            self.registry.models_by_view_name = self.get_models_by_view_name()
+        return self.registry.models_by_view_name
 
     def to_internal_value(self, data):
+        if instrumentation.enabled():
+            with instrumentation.Measurement(self, 'deserialize'):
+                return self._to_internal_value(data)
+        return self._to_internal_value(data)
+
+    def _to_internal_value(self, data):
+        return self._deserialize(data)[1]
+
+    def _deserialize(self, data):
         try:
-            serializer = self.get_deserializer_for_data(data)
+            if self._overrides_get_deserializer_for_data():
+                serializer, value = self.get_deserializer_for_data(data), empty
+            else:
+                serializer, value = self.get_deserializer_and_value_for_data(data)
         except ImproperlyConfigured as e:
             raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: e})
-        return serializer.to_internal_value(data)
+        if value is empty:
+            with self._serializing(serializer):
+                value = serializer.to_internal_value(data)
+        return serializer, value
+
+    async def ato_internal_value(self, data):
+        """
+        Async counterpart of `to_internal_value()`. Hyperlinks routed by view
+        name are looked up with the async ORM; anything else is validated in
+        a thread with `sync_to_async()`.
+        """
+        if (self.models_by_view_name is None or self.discriminator is not None
+                or not isinstance(data, str) or not self._uses_default_resolution()):
+            return await sync_to_async(self.to_internal_value)(data)
+        try:
+            serializer, value = await self.aget_hyperlinked_deserializer_and_value(data)
+        except ImproperlyConfigured as e:
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: e})
+        return value
+
+    async def ato_representation(self, instance):
+        """
+        Async counterpart of `to_representation()`. Registered serializers may
+        use the ORM, so they're run in a thread with `sync_to_async()`.
+        """
+        return await sync_to_async(self.to_representation)(instance)
 
     def to_representation(self, instance):
-        serializer = self.get_serializer_for_instance(instance)
-        return serializer.to_representation(instance)
+        if instrumentation.enabled():
+            with instrumentation.Measurement(self, 'serialize'):
+                serializer = self.get_serializer_for_instance(instance)
+                with self._serializing(serializer):
+                    return self._to_representation(serializer, instance)
+        return self._to_representation(self.get_serializer_for_instance(instance), instance)
+
+    def _to_representation(self, serializer, instance):
+        # Only complete representations are cached, so that they're all
+        # invalidated.
+        cache = None if hasattr(serializer, 'sparse_field_names') else self.cache
+        if self.memo_size is None and cache is None:
+            return serializer.to_representation(instance)
+        if not isinstance(instance, Model) or instance.pk is None:
+            return serializer.to_representation(instance)
+
+        if self.memo_size is not None:
+            memo = self.get_representation_memo()
+            key = (id(serializer), instance._meta.label_lower, instance.pk)
+            representation = memo.get(key, empty)
+            if representation is not empty:
+                return representation
+
+        representation = empty
+        if cache is not None:
+            representation = cache.get(serializer, instance, empty)
+        if representation is empty:
+            representation = serializer.to_representation(instance)
+            if cache is not None:
+                cache.set(serializer, instance, representation)
+
+        if self.memo_size is not None:
+            memo.set(key, representation)
+        return representation
+
+    def get_representation_memo(self):
+        """
+        Return the memo of representations for this serializer run, kept in
+        the serializer context.
+        """
+        memos = self.context.setdefault(MEMO_CONTEXT_KEY, {})
+        try:
+            return memos[id(self)]
+        except KeyError:
+            memo = memos[id(self)] = RepresentationMemo(self.memo_size)
+            return memo
 
     def get_serializer_for_instance(self, instance):
-        # Use registered superclasses, rather than only the exact model.
-        # (But prefer things earlier in the MRO, so if the exact model is registered,
-        # use that in preference to any superclasses)
-        for klass in instance.__class__.mro():
-            if klass in self.serializers:
-                return self.serializers[klass]
+        return self.get_representation_serializer(instance.__class__)
+
+    def get_representation_serializer(self, model):
+        """
+        Return the serializer to represent instances of `model` with: the one
+        registered for it, only building the fields of its fieldset, if it
+        has one (see `get_fieldsets`). Names which aren't fields of the
+        serializer are ignored.
+        """
+        serializer = self.get_serializer_for_model(model)
+        fieldsets = self.get_fieldsets()
+        if not fieldsets or not isinstance(serializer, serializers.Serializer):
+            return serializer
+        registered = self.get_registered_model(model)
+        field_names = fieldsets.get(self.get_model_type(registered))
+        if field_names is None:
+            return serializer
+
+        try:
+            return self._sparse_serializers[registered, field_names]
+        except KeyError:
+            pass
+        # Sparse classes are kept for the life of the process, so they're
+        # only created for actual fields, whatever the client asks for.
+        names = tuple(sorted(set(field_names).intersection(serializer.fields)))
+        if len(names) == len(serializer.fields):
+            sparse = serializer
+        else:
+            sparse_class = self.registry.get_sparse_class(type(serializer), names)
+            sparse = sparse_class(*serializer._args, **serializer._kwargs)
+            sparse.bind('', self)
+        self._sparse_serializers[registered, field_names] = sparse
+        return sparse
+
+    def get_fieldsets(self):
+        """
+        Return the names of the fields to represent, as tuples by model type
+        (see `get_model_type`). They're taken from the `fieldsets` dict of
+        the context, or else from the `fields[<type>]` query parameters of
+        its request, as comma separated names. Types without a fieldset are
+        represented with all their fields.
+        """
+        if self._fieldsets is not None:
+            return self._fieldsets
+        context = self.context
+        fieldsets = context.get('fieldsets')
+        if fieldsets is None:
+            params = getattr(context.get('request'), 'query_params', None) or {}
+            fieldsets = {
+                key[len('fields['):-1]: value for key, value in params.items()
+                if key.startswith('fields[') and key.endswith(']')
+            }
+        fieldsets = {
+            model_type: tuple(name for name in names.split(',') if name)
+            if isinstance(names, str) else tuple(names)
+            for model_type, names in fieldsets.items()
+        }
+        if self.parent is not None or hasattr(self, '_context'):
+            # Once bound, the context doesn't change.
+            self._fieldsets = fieldsets
+        return fieldsets
+
+    def get_serializer_for_model(self, model):
+        return self.serializers[self.get_registered_model(model)]
 
-        raise serializers.ValidationError(self.error_messages['no_model_match'])
+    def get_registered_model(self, model):
+        """
+        Return the registered model `model` is handled as: itself, or its
+        closest registered superclass.
+        """
+        try:
+            registered = self.registry.models_by_class[model]
+        except KeyError:
+            # Use registered superclasses, rather than only the exact model.
+            # (But prefer things earlier in the MRO, so if the exact model is registered,
+            # use that in preference to any superclasses)
+            registered = next((klass for klass in model.mro() if klass in self.serializers), None)
+            self.registry.models_by_class[model] = registered
+        if registered is None:
+            raise serializers.ValidationError(self.error_messages['no_model_match'])
+        return registered
+
+    def prepare(self):
+        """
+        Do ahead of time what's otherwise done when handling the first
+        objects: create the registered serializers, and find the one for
+        each installed model, proxy models and subclasses included.
+        """
+        self.serializers.bind_all()
+        for model in apps.get_models():
+            try:
+                self.get_serializer_for_model(model)
+            except serializers.ValidationError:
+                pass
+        self.build_model_maps()
+
+    def get_model_type(self, model):
+        """
+        Return the value identifying `model` in discriminated data.
+        """
+        return model._meta.model_name
+
+    def get_models_by_type(self):
+        models_by_type = {}
+        for model in self.serializers:
+            model_type = self.get_model_type(model)
+            if model_type in models_by_type:
+                raise ImproperlyConfigured(
+                    'Models %r and %r share the type %r.' % (
+                        models_by_type[model_type], model, model_type))
+            models_by_type[model_type] = model
+        return models_by_type
+
+    def get_models_by_view_name(self):
+        """
+        Map view names to models when every registered serializer is a plain
+        `HyperlinkedRelatedField`, so a URL can be routed to the right one
+        with a single `resolve()`. Otherwise return None.
+        """
+        models_by_view_name = {}
+        for model, serializer in self.serializers.items():
+            if not isinstance(serializer, serializers.HyperlinkedRelatedField):
+                return None
+            if (type(serializer).to_internal_value
+                    is not serializers.HyperlinkedRelatedField.to_internal_value):
+                return None
+            if serializer.view_name in models_by_view_name:
+                return None
+            models_by_view_name[serializer.view_name] = model
+        return models_by_view_name or None
+
+    def get_data_type(self, value):
+        if callable(self.discriminator):
+            return self.discriminator(value)
+        if isinstance(value, Mapping):
+            return value.get(self.discriminator)
+        return None
 
     def get_deserializer_for_data(self, value):
+        return self.get_deserializer_and_value_for_data(value)[0]
+
+    def get_deserializer_and_value_for_data(self, value):
+        """
+        Return the serializer able to handle `value`, together with the
+        result of its `to_internal_value()`, so that it need not be
+        computed a second time.
+        """
+        if self.discriminator is not None:
+            try:
+                model = self.models_by_type[self.get_data_type(value)]
+            except (KeyError, TypeError):
+                self.fail('no_model_match')
+            serializer = self.serializers[model]
+            with self._serializing(serializer):
+                return serializer, serializer.to_internal_value(value)
+
+        if self.models_by_view_name is not None and isinstance(value, str):
+            return self.get_hyperlinked_deserializer_and_value(value)
+
         # While one could easily execute the "try" block within
         # to_internal_value and reduce operations, I consider the concept of
         # serializing is already very naive and vague, that's why I'd
         # go for stringency with the deserialization process here.
-        serializers = []
-        for serializer in self.serializers.values():
+        matches = []
+        measurement = self._get_measurement()
+        prune = self.can_prune_candidates(value)
+        first_match = self.resolution == 'first-match'
+        models = self.registry.get_candidate_order() if first_match else self.serializers
+        for model in models:
+            serializer = self.serializers[model]
+            if prune and not self.get_required_keys(serializer).issubset(value):
+                # It would only report missing fields.
+                continue
+            if measurement is not None:
+                start = perf_counter()
             try:
-                serializer.to_internal_value(value)
                 # Collects all serializers that can handle the input data.
-                serializers.append(serializer)
+                matches.append((serializer, serializer.to_internal_value(value)))
             except Exception:
-                pass
+                failed = True
+            else:
+                failed = False
+            if measurement is not None:
+                measurement.tried(serializer, perf_counter() - start, failed)
+            if first_match and not failed:
+                self.registry.record_match(model)
+                return matches[0]
         # If no serializer found, raise error.
-        l = len(serializers)
+        l = len(matches)
         if l < 1:
-            raise ImproperlyConfigured(
-                'Could not determine a valid serializer for value %r.' % value)
+            raise self._no_deserializer_found(value)
         elif l > 1:
             raise ImproperlyConfigured(
                 'There were multiple serializers found for value %r.' % value)
-        return serializers[0]
+        return matches[0]
+
+    def can_prune_candidates(self, value):
+        """
+        Return whether registered serializers may be skipped when `value`
+        lacks any of their required keys (see `get_required_keys`).
+        """
+        return (
+            type(value) is dict
+            and not getattr(self.root, 'partial', False)
+        )
+
+    def get_required_keys(self, serializer):
+        """
+        Return the keys which data must have to be valid for `serializer`:
+        those of its required fields, if it's a plain `Serializer`.
+        """
+        try:
+            return self._required_keys[serializer]
+        except KeyError:
+            pass
+        keys = frozenset()
+        if (isinstance(serializer, serializers.Serializer)
+                and type(serializer).to_internal_value is serializers.Serializer.to_internal_value):
+            keys = frozenset(
+                field.field_name for field in serializer._writable_fields
+                if field.required and _reads_own_key(field)
+            )
+        self._required_keys[serializer] = keys
+        return keys
+
+    def get_hyperlinked_deserializer_and_value(self, value):
+        """
+        Resolve the URL once, and only look up the object with the
+        serializer registered for the matched view name.
+        """
+        match, model = self._resolve_hyperlink(value)
+        serializer = self.serializers[model]
+        target = self._get_prefetched_target(value, model, match)
+        if target is not empty:
+            return serializer, target
+
+        try:
+            with self._serializing(serializer):
+                return serializer, serializer.get_object(match.view_name, match.args, match.kwargs)
+        except Exception:
+            raise self._no_deserializer_found(value)
+
+    async def aget_hyperlinked_deserializer_and_value(self, value):
+        """
+        Async counterpart of `get_hyperlinked_deserializer_and_value()`.
+        """
+        match, model = self._resolve_hyperlink(value)
+        serializer = self.serializers[model]
+        target = self._get_prefetched_target(value, model, match)
+        if target is not empty:
+            return serializer, target
+
+        try:
+            if type(serializer).get_object is serializers.HyperlinkedRelatedField.get_object:
+                lookup_kwargs = {
+                    serializer.lookup_field: match.kwargs[serializer.lookup_url_kwarg],
+                }
+                return serializer, await aget(serializer.get_queryset(), **lookup_kwargs)
+            get_object = sync_to_async(serializer.get_object)
+            return serializer, await get_object(match.view_name, match.args, match.kwargs)
+        except Exception:
+            raise self._no_deserializer_found(value)
+
+    def _get_prefetched_target(self, value, model, match):
+        prefetched = self._prefetched_targets.get(model)
+        if prefetched is None:
+            return empty
+        try:
+            target = prefetched[match.kwargs[self.serializers[model].lookup_url_kwarg]]
+        except KeyError:
+            return empty
+        if target is None:
+            raise self._no_deserializer_found(value)
+        return target
+
+    def prefetch_hyperlinked_targets(self, values):
+        """
+        Look up the targets of all the given hyperlinks with one `in_bulk()`
+        query per model, for use by subsequent calls to `to_internal_value()`.
+        Values which can't be handled in bulk are left for it to deal with.
+        """
+        if self.models_by_view_name is None:
+            return
+        lookups = {}
+        for value in values:
+            if not isinstance(value, str):
+                continue
+            try:
+                match, model = self._resolve_hyperlink(value)
+            except ImproperlyConfigured:
+                continue
+            serializer = self.serializers[model]
+            try:
+                lookup_value = match.kwargs[serializer.lookup_url_kwarg]
+            except KeyError:
+                continue
+            lookups.setdefault(model, set()).add(lookup_value)
+
+        for model, lookup_values in lookups.items():
+            serializer = self.serializers[model]
+            if type(serializer).get_object is not serializers.HyperlinkedRelatedField.get_object:
+                continue
+            queryset = serializer.get_queryset()
+            if serializer.lookup_field == 'pk':
+                lookup_field = queryset.model._meta.pk
+            else:
+                lookup_field = queryset.model._meta.get_field(serializer.lookup_field)
+            keys = {}
+            for lookup_value in lookup_values:
+                try:
+                    keys[lookup_value] = lookup_field.to_python(lookup_value)
+                except ValidationError:
+                    pass
+            try:
+                targets = queryset.in_bulk(set(keys.values()), field_name=serializer.lookup_field)
+            except (TypeError, ValueError):
+                continue
+            self._prefetched_targets[model] = {
+                lookup_value: targets.get(key) for lookup_value, key in keys.items()
+            }
+
+    def clear_prefetched_targets(self):
+        self._prefetched_targets = {}
+
+    def _resolve_hyperlink(self, value):
+        # Mirrors `HyperlinkedRelatedField.to_internal_value()`.
+        path = value
+        if path.startswith(('http:', 'https:')):
+            # If needed convert absolute URLs to relative path
+            path = parse.urlparse(path).path
+            prefix = get_script_prefix()
+            if path.startswith(prefix):
+                path = '/' + path[len(prefix):]
+        path = uri_to_iri(parse.unquote(path))
+
+        try:
+            match = resolve(path)
+            return match, self._get_versioned_models_by_view_name()[match.view_name]
+        except (Resolver404, KeyError):
+            raise self._no_deserializer_found(value)
+
+    def _get_versioned_models_by_view_name(self):
+        request = self.context.get('request')
+        try:
+            get_versioned_viewname = request.versioning_scheme.get_versioned_viewname
+        except AttributeError:
+            return self.models_by_view_name
+        return {
+            get_versioned_viewname(view_name, request): model
+            for view_name, model in self.models_by_view_name.items()
+        }
+
+    def _no_deserializer_found(self, value):
+        return ImproperlyConfigured(
+            'Could not determine a valid serializer for value %r.' % value)
+
+    def _get_measurement(self):
+        measurement = instrumentation.current() if instrumentation.enabled() else None
+        if measurement is not None and measurement.field is self:
+            return measurement
+        return None
+
+    def _serializing(self, serializer):
+        measurement = self._get_measurement()
+        if measurement is None:
+            return nullcontext()
+        return measurement.serializing(serializer)
+
+    def _uses_default_resolution(self):
+        return (
+            not self._overrides_get_deserializer_for_data()
+            and type(self).get_deserializer_and_value_for_data
+            is GenericSerializerMixin.get_deserializer_and_value_for_data
+        )
+
+    def _overrides_get_deserializer_for_data(self):
+        # Subclasses customising only `get_deserializer_for_data` still get
+        # their choice of serializer respected.
+        return (
+            type(self).get_deserializer_for_data
+            is not GenericSerializerMixin.get_deserializer_for_data
+        )
+
+
+class GenericModelListSerializer(serializers.ListSerializer):
+    """
+    The `ListSerializer` of `GenericModelSerializer`.
+
+    Rather than serializing items one at a time, items are grouped by the
+    serializer they're delegated to, and each group is handed to that
+    serializer's own list serializer, which may handle it in bulk.
+    """
+    def __init__(self, *args, **kwargs):
+        self.batch_size = kwargs.pop('batch_size', None)
+        child = kwargs.get('child')
+        # `many_init()` passes the registered serializers on, as for the
+        # child. They aren't the instance.
+        if (args and child is not None
+                and (args[0] is child.registry or args[0] is child.registry.declared)):
+            args = args[1:]
+            self._args = (child.registry,) + tuple(self._args[1:])
+        super(GenericModelListSerializer, self).__init__(*args, **kwargs)
+        self._list_serializers = {}
+        self._deserializers = None
+
+    def to_representation(self, data):
+        if self.serializes_one_at_a_time():
+            return super(GenericModelListSerializer, self).to_representation(data)
+
+        iterable = data.all() if isinstance(data, Manager) else data
+        items = list(iterable)
+        groups = self.group_items(items)
+        results = [
+            self.get_list_serializer(serializer).to_representation([items[i] for i in indexes])
+            for serializer, indexes in groups.items()
+        ]
+        return self.merge_groups(len(items), groups.values(), results)
+
+    def serializes_one_at_a_time(self):
+        # Memoized, cached and instrumented representations are handled by
+        # the child, item by item, as are those of children customising
+        # `to_representation()`, which grouping would bypass.
+        return (
+            self.child.memo_size is not None or self.child.cache is not None
+            or instrumentation.enabled()
+            or type(self.child).to_representation is not GenericSerializerMixin.to_representation
+        )
+
+    def group_items(self, items):
+        """
+        Return the indexes of `items`, grouped by the serializer they're
+        delegated to.
+        """
+        groups = {}
+        for index, item in enumerate(items):
+            serializer = self.child.get_serializer_for_instance(item)
+            groups.setdefault(serializer, []).append(index)
+        return groups
+
+    def merge_groups(self, length, groups, results):
+        representations = [None] * length
+        for indexes, group in zip(groups, results):
+            for index, representation in zip(indexes, group):
+                representations[index] = representation
+        return representations
+
+    def iter_representation(self, data=None, chunk_size=2000):
+        """
+        Yield the representations of `data` (by default, the instance of the
+        serializer) one at a time, so that they needn't all be held in memory.
+
+        Items are read and serialized `chunk_size` at a time.
+        """
+        if data is None:
+            data = self.instance
+        for chunk in iter_chunks(data, chunk_size):
+            yield from self.to_representation(chunk)
+
+    async def ato_representation(self, data=None):
+        """
+        Async counterpart of `to_representation()`. Querysets are loaded with
+        the async ORM, and the groups of items are serialized concurrently,
+        each in a thread with `sync_to_async()`.
+        """
+        if data is None:
+            data = self.instance
+        if isinstance(data, Manager):
+            data = data.all()
+        items = await alist(data) if isinstance(data, QuerySet) else list(data)
+        if self.serializes_one_at_a_time():
+            return await sync_to_async(super(GenericModelListSerializer, self).to_representation)(items)
+
+        groups = self.group_items(items)
+        results = await asyncio.gather(*(
+            sync_to_async(self.get_list_serializer(serializer).to_representation)(
+                [items[i] for i in indexes])
+            for serializer, indexes in groups.items()
+        ))
+        return self.merge_groups(len(items), groups.values(), results)
+
+    def to_internal_value(self, data):
+        # Remember which registered serializer validated each item, for
+        # `create()`.
+        self.child._deserializers = []
+        try:
+            return super(GenericModelListSerializer, self).to_internal_value(data)
+        finally:
+            self._deserializers, self.child._deserializers = self.child._deserializers, None
+
+    def create(self, validated_data):
+        """
+        Create the validated items grouped by the serializer which validated
+        them, with one `bulk_create()` per model where possible, and return
+        them in their original order.
+        """
+        if self._deserializers is None or len(self._deserializers) != len(validated_data):
+            raise ImproperlyConfigured('The data must be validated before creating objects.')
+        groups = {}
+        for index, serializer in enumerate(self._deserializers):
+            groups.setdefault(serializer, []).append(index)
+        results = [
+            self.create_group(serializer, [validated_data[i] for i in indexes])
+            for serializer, indexes in groups.items()
+        ]
+        return self.merge_groups(len(validated_data), groups.values(), results)
+
+    def create_group(self, serializer, validated_data):
+        """
+        Create the items validated by `serializer`: with its own list
+        serializer if that customises `create()`, in bulk if `serializer` is
+        a plain `ModelSerializer`, or else one at a time.
+        """
+        list_serializer = self.get_list_serializer(serializer)
+        if type(list_serializer).create is not serializers.ListSerializer.create:
+            return list_serializer.create(validated_data)
+        if not self.can_bulk_create(serializer, validated_data):
+            return [serializer.create(attrs) for attrs in validated_data]
+
+        ModelClass = serializer.Meta.model
+        instances = []
+        for attrs in validated_data:
+            raise_errors_on_nested_writes('create', serializer, attrs)
+            instances.append(ModelClass(**attrs))
+        return ModelClass._default_manager.bulk_create(instances, batch_size=self.batch_size)
+
+    def can_bulk_create(self, serializer, validated_data):
+        """
+        Return whether the items validated by `serializer` can be created
+        with `bulk_create()`, which neither calls `save()` nor sends signals,
+        and only sets the primary keys of the objects on some databases.
+        """
+        if not isinstance(serializer, serializers.ModelSerializer):
+            return False
+        if type(serializer).create is not serializers.ModelSerializer.create:
+            return False
+        features = connections[router.db_for_write(serializer.Meta.model)].features
+        # Named `can_return_ids_from_bulk_insert` before Django 3.0.
+        if not getattr(features, 'can_return_rows_from_bulk_insert',
+                       getattr(features, 'can_return_ids_from_bulk_insert', False)):
+            return False
+        opts = serializer.Meta.model._meta
+        if any(parent._meta.concrete_model is not opts.concrete_model
+               for parent in opts.get_parent_list()):
+            # Multi-table inheritance.
+            return False
+        relations = model_meta.get_field_info(serializer.Meta.model).relations
+        to_many = {name for name, relation in relations.items() if relation.to_many}
+        return not any(to_many.intersection(attrs) for attrs in validated_data)
+
+    def get_list_serializer(self, serializer):
+        """
+        Return the list serializer `serializer` would have with `many=True`.
+        """
+        try:
+            return self._list_serializers[serializer]
+        except KeyError:
+            pass
+        list_serializer = type(serializer).many_init(*serializer._args, **serializer._kwargs)
+        list_serializer.bind('', self.child)
+        self._list_serializers[serializer] = list_serializer
+        return list_serializer
 
 
 class GenericModelSerializer(GenericSerializerMixin, serializers.Serializer):
@@ -82,3 +1055,39 @@ class GenericModelSerializer(GenericSerializerMixin, serializers.Serializer):
     Delegates serialization and deserialization to registered serializers
     based on the type of the model.
     """
+    class Meta:
+        list_serializer_class = GenericModelListSerializer
+
+    def __init__(self, *args, **kwargs):
+        super(GenericModelSerializer, self).__init__(*args, **kwargs)
+        self._deserializer = None
+        # Collected while a list serializer validates its items.
+        self._deserializers = None
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        """
+        Accept a `batch_size` for the list serializer's `bulk_create()`s.
+        """
+        batch_size = kwargs.pop('batch_size', None)
+        list_serializer = super(GenericModelSerializer, cls).many_init(*args, **kwargs)
+        if batch_size is not None:
+            list_serializer.batch_size = batch_size
+            list_serializer._kwargs['batch_size'] = batch_size
+        return list_serializer
+
+    def _to_internal_value(self, data):
+        serializer, value = self._deserialize(data)
+        self._deserializer = serializer
+        if self._deserializers is not None:
+            self._deserializers.append(serializer)
+        return value
+
+    def create(self, validated_data):
+        """
+        Create the object with the registered serializer which validated the
+        data.
+        """
+        if self._deserializer is None:
+            raise ImproperlyConfigured('The data must be validated before creating an object.')
+        return self._deserializer.create(validated_data)
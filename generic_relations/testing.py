@@ -0,0 +1,31 @@
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+__all__ = ('assert_query_budget', 'query_budget',)
+
+
+@contextmanager
+def query_budget(max_queries, using=DEFAULT_DB_ALIAS):
+    """
+    Fail with an `AssertionError` listing the queries made if the block
+    makes more than `max_queries` of them.
+    """
+    with CaptureQueriesContext(connections[using]) as context:
+        yield context
+    if len(context) > max_queries:
+        queries = '\n'.join(
+            '%d. %s' % (i, query['sql']) for i, query in enumerate(context.captured_queries, 1))
+        raise AssertionError('%d queries executed, at most %d expected.\nQueries:\n%s' % (
+            len(context), max_queries, queries))
+
+
+def assert_query_budget(serializer, max_queries, using=DEFAULT_DB_ALIAS):
+    """
+    Return the `data` of `serializer`, failing with an `AssertionError` if
+    producing it took more than `max_queries` queries.
+    """
+    with query_budget(max_queries, using=using):
+        return serializer.data
@@ -1,21 +1,37 @@
 
 
+import threading
 import warnings
+from unittest import mock
 
 try:
     from django.urls import re_path as url
 except ImportError:
     from django.conf.urls import url
 
+from asgiref.sync import async_to_sync
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ImproperlyConfigured
 from django.test import TestCase, RequestFactory
-from django.test.utils import override_settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve
 
 from rest_framework import serializers
+from rest_framework.request import Request
 from rest_framework.reverse import reverse
 from rest_framework.settings import api_settings
 
-from generic_relations.relations import GenericRelatedField
+from generic_relations import instrumentation
+from generic_relations.prefetch import get_related_lookups, get_values_fields
+from generic_relations.relations import (
+    GenericRelatedField, GenericRelatedListSerializer, GenericRelationSerializer,
+    WritableGenericRelationsMixin,
+)
+from generic_relations.serializers import INCLUDED_CONTEXT_KEY, prepare_fields
+from generic_relations.testing import assert_query_budget
 from generic_relations.tests.models import Bookmark, Detachable, Note, NoteProxy, Tag
 
 
@@ -30,6 +46,7 @@ request = factory.get('/')
 def dummy_view(request, pk):
     pass
 
+
 urlpatterns = [
     url(r'^bookmark/(?P<pk>[0-9]+)/$', dummy_view, name='bookmark-detail'),
     url(r'^detachable/(?P<pk>[0-9]+)/$', dummy_view, name='detachable-detail'),
@@ -115,6 +132,56 @@ class TestGenericRelatedFieldSerialization(TestCase):
         ]
         self.assertEqual(serializer.data, expected)
 
+    def test_hyperlinks_without_loading_targets(self):
+        class TagSerializer(serializers.ModelSerializer):
+            tagged_item = GenericRelatedField(
+                {
+                    Bookmark: serializers.HyperlinkedRelatedField(
+                        view_name='bookmark-detail',
+                        queryset=Bookmark.objects.all()),
+                    Note: serializers.HyperlinkedRelatedField(
+                        view_name='note-detail',
+                        queryset=Note.objects.all()),
+                },
+                read_only=True,
+                pk_only_targets=True,
+            )
+
+            class Meta:
+                model = Tag
+                exclude = ('id', 'content_type', 'object_id', )
+
+        serializer = TagSerializer(Tag.objects.all(), many=True, context={'request': request})
+        with self.assertNumQueries(1):
+            data = serializer.data
+        self.assertEqual([item['tagged_item'] for item in data], [
+            'http://testserver/bookmark/1/',
+            'http://testserver/bookmark/1/',
+            'http://testserver/note/1/',
+        ])
+
+    def test_dangling_hyperlinked_target(self):
+        Tag.objects.create(
+            tag='dangling', content_type=ContentType.objects.get_for_model(Note), object_id=9999)
+
+        class TagSerializer(serializers.ModelSerializer):
+            tagged_item = GenericRelatedField(
+                {
+                    Note: serializers.HyperlinkedRelatedField(
+                        view_name='note-detail',
+                        queryset=Note.objects.all()),
+                },
+                read_only=True,
+            )
+
+            class Meta:
+                model = Tag
+                fields = ('tagged_item',)
+
+        serializer = TagSerializer(
+            Tag.objects.get(tag='dangling'), context={'request': request})
+        self.assertEqual(serializer.data, {'tagged_item': None})
+
     def test_relations_as_nested(self):
 
         class TagSerializer(serializers.ModelSerializer):
@@ -187,6 +254,248 @@ class TestGenericRelatedFieldSerialization(TestCase):
         ]
         self.assertEqual(serializer.data, expected)
 
+    def test_mixed_serializers_pk_only_targets(self):
+        class TagSerializer(serializers.ModelSerializer):
+            tagged_item = GenericRelatedField(
+                {
+                    Bookmark: BookmarkSerializer(),
+                    Note: serializers.HyperlinkedRelatedField(
+                        view_name='note-detail',
+                        queryset=Note.objects.all()),
+                },
+                read_only=True,
+                pk_only_targets=True,
+            )
+
+            class Meta:
+                model = Tag
+                exclude = ('id', 'content_type', 'object_id', )
+
+        serializer = TagSerializer(Tag.objects.all(), many=True, context={'request': request})
+        expected = [
+            {
+                'tagged_item': {
+                    'url': 'https://www.djangoproject.com/'
+                },
+                'tag': 'django'
+            },
+            {
+                'tagged_item': {
+                    'url': 'https://www.djangoproject.com/'
+                },
+                'tag': 'python'
+            },
+            {
+                'tagged_item': 'http://testserver/note/1/',
+                'tag': 'reminder'
+            }
+        ]
+        # Only the bookmarks need to be loaded.
+        with self.assertNumQueries(2):
+            self.assertEqual(serializer.data, expected)
+
+    def test_targets_prefetched(self):
+        Tag.objects.create(tagged_item=Note.objects.create(text='Reticulate the splines'), tag='todo')
+        Tag.objects.create(tagged_item=Bookmark.objects.create(url='https://www.python.org/'), tag='python')
+
+        class TagSerializer(serializers.ModelSerializer):
+            tagged_item = GenericRelatedField({
+                Bookmark: BookmarkSerializer(),
+                Note: NoteSerializer(),
+            }, read_only=True)
+
+            class Meta:
+                model = Tag
+                exclude = ('id', 'content_type', 'object_id', )
+
+        serializer = TagSerializer(Tag.objects.all(), many=True)
+        # One query for the tags, and one per content type.
+        with self.assertNumQueries(3):
+            data = serializer.data
+        self.assertEqual([item['tagged_item'] for item in data], [
+            {'url': 'https://www.djangoproject.com/'},
+            {'url': 'https://www.djangoproject.com/'},
+            {'text': 'Remember the milk'},
+            {'text': 'Reticulate the splines'},
+            {'url': 'https://www.python.org/'},
+        ])
+
+        serializer = TagSerializer(Tag.objects.all(), many=True)
+        serializer.child.fields['tagged_item'].prefetch_targets = False
+        with self.assertNumQueries(6):
+            serializer.data
+
+    def test_targets_represented_from_values(self):
+        class TagSerializer(serializers.ModelSerializer):
+            tagged_item = GenericRelatedField({
+                Bookmark: BookmarkSerializer(),
+                Note: NoteProxySerializer(),
+            }, read_only=True)
+
+            class Meta:
+                model = Tag
+                exclude = ('id', 'content_type', 'object_id', )
+
+        serializer = TagSerializer(Tag.objects.order_by('pk'), many=True)
+        with mock.patch.object(Bookmark, 'from_db') as bookmark_from_db, \
+                self.assertNumQueries(3):
+            data = serializer.data
+        # Bookmarks have only plain fields, but notes have a method field.
+        bookmark_from_db.assert_not_called()
+        self.assertEqual([item['tagged_item'] for item in data], [
+            {'url': 'https://www.djangoproject.com/'},
+            {'url': 'https://www.djangoproject.com/'},
+            {'text': 'proxied: Remember the milk'},
+        ])
+        fields = get_values_fields(BookmarkSerializer(), Bookmark)
+        self.assertEqual([field.field_name for field in fields], ['url'])
+        self.assertIsNone(get_values_fields(NoteProxySerializer(), Note))
+
+    def test_custom_serializer_for_instance(self):
+        class UpperBookmarkSerializer(serializers.ModelSerializer):
+            url = serializers.SerializerMethodField()
+
+            class Meta:
+                model = Bookmark
+                fields = ('url',)
+
+            def get_url(self, obj):
+                return obj.url.upper()
+
+        class CustomField(GenericRelatedField):
+            def get_serializer_for_instance(self, instance):
+                if isinstance(instance, Bookmark):
+                    return UpperBookmarkSerializer(context=self.context)
+                return super(CustomField, self).get_serializer_for_instance(instance)
+
+        class TagSerializer(serializers.ModelSerializer):
+            tagged_item = CustomField({
+                Bookmark: BookmarkSerializer(),
+                Note: NoteSerializer(),
+            }, read_only=True)
+
+            class Meta:
+                model = Tag
+                fields = ('tagged_item',)
+
+        tag = Tag.objects.filter(object_id=self.bookmark.pk, content_type__model='bookmark').first()
+        data = TagSerializer(Tag.objects.order_by('pk'), many=True).data
+        self.assertIn(TagSerializer(tag).data, data)
+        self.assertIn({'tagged_item': {'url': 'HTTPS://WWW.DJANGOPROJECT.COM/'}}, data)
+
+    def test_lazy_load(self):
+        def get_serializer(**kwargs):
+            class TagSerializer(serializers.ModelSerializer):
+                tagged_item = GenericRelatedField({
+                    Bookmark: BookmarkSerializer(),
+                    Note: NoteSerializer(),
+                }, read_only=True, **kwargs)
+
+                class Meta:
+                    model = Tag
+                    exclude = ('id', 'content_type', 'object_id', )
+
+            return TagSerializer(Tag.objects.all(), many=True)
+
+        serializer = get_serializer(lazy_load='raise')
+        data = assert_query_budget(serializer, 3)
+        self.assertEqual(len(data), 3)
+
+        serializer = get_serializer(lazy_load='raise', prefetch_targets=False)
+        with self.assertRaisesMessage(RuntimeError, 'prefetch_related(\'tagged_item\')'):
+            serializer.data
+
+        serializer = get_serializer(prefetch_targets=False)
+        with override_settings(GENERIC_RELATIONS_LAZY_LOAD='warn'), self.assertWarns(RuntimeWarning):
+            serializer.data
+
+        serializer = get_serializer(lazy_load='log', prefetch_targets=False)
+        with self.assertLogs('generic_relations', 'WARNING'):
+            serializer.data
+
+        serializer = get_serializer(prefetch_targets=False)
+        with self.assertRaisesMessage(AssertionError, '4 queries executed, at most 3 expected'):
+            assert_query_budget(serializer, 3)
+
+        with self.assertRaises(ImproperlyConfigured):
+            get_serializer(lazy_load='ignore')
+
+    def test_nested_relations_prefetched(self):
+        for i in range(3):
+            bookmark = Bookmark.objects.create(url='https://example.com/%d/' % i)
+            Tag.objects.create(tagged_item=bookmark, tag='example')
+            Tag.objects.create(tagged_item=bookmark, tag='bookmark')
+
+        class TagNameSerializer(serializers.ModelSerializer):
+            class Meta:
+                model = Tag
+                fields = ('tag', )
+
+        class TaggedBookmarkSerializer(serializers.ModelSerializer):
+            tags = TagNameSerializer(many=True, read_only=True)
+
+            class Meta:
+                model = Bookmark
+                fields = ('url', 'tags')
+
+        class TaggedNoteSerializer(serializers.ModelSerializer):
+            tags = serializers.SlugRelatedField(many=True, read_only=True, slug_field='tag')
+
+            class Meta:
+                model = Note
+                fields = ('text', 'tags')
+
+        class TagSerializer(serializers.ModelSerializer):
+            tagged_item = GenericRelatedField({
+                Bookmark: TaggedBookmarkSerializer(),
+                Note: TaggedNoteSerializer(),
+            }, read_only=True)
+
+            class Meta:
+                model = Tag
+                exclude = ('id', 'content_type', 'object_id', )
+
+        serializer = TagSerializer(Tag.objects.all(), many=True)
+        # The tags, then the targets and their tags for each content type.
+        with self.assertNumQueries(5):
+            data = serializer.data
+        self.assertEqual(data[2]['tagged_item'], {'text': 'Remember the milk', 'tags': ['reminder']})
+        self.assertEqual(data[-1]['tagged_item'], {
+            'url': 'https://example.com/2/',
+            'tags': [{'tag': 'example'}, {'tag': 'bookmark'}],
+        })
+
+    def test_related_lookups(self):
+        class TagSerializer(serializers.ModelSerializer):
+            tagged_item = GenericRelatedField({
+                Bookmark: BookmarkSerializer(),
+                Note: NoteSerializer(),
+            }, read_only=True)
+
+            class Meta:
+                model = Tag
+                fields = ('tag', 'tagged_item')
+
+        class TaggedBookmarkSerializer(serializers.ModelSerializer):
+            tags = TagSerializer(many=True, read_only=True)
+
+            class Meta:
+                model = Bookmark
+                fields = ('url', 'tags')
+
+        class DeclaredNoteSerializer(serializers.ModelSerializer):
+            class Meta:
+                model = Note
+                fields = ('text', )
+                prefetch_related = ('tags', )
+
+        self.assertEqual(
+            get_related_lookups(TaggedBookmarkSerializer(), Bookmark),
+            ([], ['tags', 'tags__tagged_item']),
+        )
+        self.assertEqual(get_related_lookups(DeclaredNoteSerializer(), Note), ([], ['tags']))
+        self.assertEqual(get_related_lookups(NoteSerializer(), Note), ([], []))
+
     def test_invalid_model(self):
         # Leaving out the Note model should result in a ValidationError
         class TagSerializer(serializers.ModelSerializer):
@@ -422,6 +731,78 @@ class TestGenericRelatedFieldDeserialization(TestCase):
         tag = Tag.objects.get(pk=3)
         self.assertEqual(tag.tagged_item, self.note)
 
+    def test_hyperlink_validated_once(self):
+        class TagSerializer(serializers.ModelSerializer):
+            tagged_item = GenericRelatedField(
+                {
+                    Bookmark: serializers.HyperlinkedRelatedField(
+                        view_name='bookmark-detail',
+                        queryset=Bookmark.objects.all()),
+                    Note: serializers.HyperlinkedRelatedField(
+                        view_name='note-detail',
+                        queryset=Note.objects.all()),
+                },
+                read_only=False,
+            )
+
+            class Meta:
+                model = Tag
+                exclude = ('id', 'content_type', 'object_id', )
+
+        serializer = TagSerializer(data={
+            'tag': 'reminder',
+            'tagged_item': reverse('note-detail', kwargs={'pk': self.note.pk})
+        })
+        # Only the matching candidate queries the database, and only once.
+        with self.assertNumQueries(1):
+            serializer.is_valid(raise_exception=True)
+        self.assertEqual(serializer.validated_data['tagged_item'], self.note)
+
+    def test_hyperlink_resolved_once(self):
+        tagged_item = GenericRelatedField({
+            Bookmark: serializers.HyperlinkedRelatedField(
+                view_name='bookmark-detail',
+                queryset=Bookmark.objects.all()),
+            Detachable: serializers.HyperlinkedRelatedField(
+                view_name='detachable-detail',
+                queryset=Detachable.objects.all()),
+            Note: serializers.HyperlinkedRelatedField(
+                view_name='note-detail',
+                queryset=Note.objects.all()),
+        })
+        url = 'http://testserver' + reverse('note-detail', kwargs={'pk': self.note.pk})
+        with mock.patch('generic_relations.serializers.resolve', wraps=resolve) as resolver:
+            with self.assertNumQueries(1):
+                self.assertEqual(tagged_item.to_internal_value(url), self.note)
+        resolver.assert_called_once_with('/note/%s/' % self.note.pk)
+
+    def test_hyperlink_to_missing_object(self):
+        tagged_item = GenericRelatedField({
+            Bookmark: serializers.HyperlinkedRelatedField(
+                view_name='bookmark-detail',
+                queryset=Bookmark.objects.all()),
+            Note: serializers.HyperlinkedRelatedField(
+                view_name='note-detail',
+                queryset=Note.objects.all()),
+        })
+        url = reverse('note-detail', kwargs={'pk': 1234})
+        with self.assertRaises(serializers.ValidationError) as cm:
+            tagged_item.to_internal_value(url)
+        message = 'Could not determine a valid serializer for value %r.' % url
+        self.assertEqual(cm.exception.detail, {api_settings.NON_FIELD_ERRORS_KEY: message})
+
+    def test_custom_get_deserializer_for_data(self):
+        class NoteOnlyField(GenericRelatedField):
+            def get_deserializer_for_data(self, value):
+                return self.serializers[Note]
+
+        field = NoteOnlyField({
+            Bookmark: BookmarkSerializer(),
+            Note: NoteSerializer(),
+        })
+        data = {'url': 'https://www.djangoproject.com/', 'text': 'Remember the milk'}
+        self.assertEqual(field.to_internal_value(data), {'text': 'Remember the milk'})
+
     def test_nullable_relation_serializer_save(self):
         class DetachableSerializer(serializers.ModelSerializer):
             content_object = GenericRelatedField(
@@ -470,6 +851,281 @@ class TestGenericRelatedFieldDeserialization(TestCase):
             self.assertIs(w[0].category, DeprecationWarning)
 
 
+@override_settings(ROOT_URLCONF='generic_relations.tests.test_relations')
+class TestGenericRelatedListSerializer(TestCase):
+    def setUp(self):
+        self.bookmarks = [
+            Bookmark.objects.create(url='https://example.com/%d/' % i) for i in range(3)
+        ]
+        self.notes = [Note.objects.create(text='Note %d' % i) for i in range(3)]
+
+        class TagSerializer(serializers.ModelSerializer):
+            tagged_item = GenericRelatedField({
+                Bookmark: serializers.HyperlinkedRelatedField(
+                    view_name='bookmark-detail',
+                    queryset=Bookmark.objects.all()),
+                Note: serializers.HyperlinkedRelatedField(
+                    view_name='note-detail',
+                    queryset=Note.objects.all()),
+            })
+
+            class Meta:
+                model = Tag
+                exclude = ('id', 'content_type', 'object_id', )
+                list_serializer_class = GenericRelatedListSerializer
+
+        self.serializer_class = TagSerializer
+
+    def test_targets_looked_up_per_model(self):
+        data = [
+            {
+                'tag': 'tag',
+                'tagged_item': reverse('%s-detail' % obj._meta.model_name, kwargs={'pk': obj.pk}),
+            }
+            for obj in self.bookmarks + self.notes
+        ]
+        serializer = self.serializer_class(data=data, many=True)
+        with self.assertNumQueries(2):
+            serializer.is_valid(raise_exception=True)
+        self.assertEqual(
+            [item['tagged_item'] for item in serializer.validated_data],
+            self.bookmarks + self.notes,
+        )
+
+    def test_iter_representation(self):
+        for bookmark, note in zip(self.bookmarks, self.notes):
+            Tag.objects.create(tagged_item=bookmark, tag='bookmark')
+            Tag.objects.create(tagged_item=note, tag='note')
+
+        class TagSerializer(serializers.ModelSerializer):
+            tagged_item = GenericRelatedField({
+                Bookmark: BookmarkSerializer(),
+                Note: NoteSerializer(),
+            }, read_only=True)
+
+            class Meta:
+                model = Tag
+                exclude = ('id', 'content_type', 'object_id', )
+                list_serializer_class = GenericRelatedListSerializer
+
+        queryset = Tag.objects.order_by('pk')
+        serializer = TagSerializer(queryset, many=True)
+        items = serializer.iter_representation(chunk_size=4)
+        # The tags, then the targets of each chunk of four tags.
+        with self.assertNumQueries(1 + 2 + 2):
+            first = next(items)
+            rest = list(items)
+        self.assertEqual(first, {'tag': 'bookmark', 'tagged_item': {'url': 'https://example.com/0/'}})
+        self.assertEqual(len(rest), 5)
+        self.assertEqual(rest[-1], {'tag': 'note', 'tagged_item': {'text': 'Note 2'}})
+        self.assertIsNone(queryset._result_cache)
+
+    def test_ato_representation(self):
+        for bookmark, note in zip(self.bookmarks, self.notes):
+            Tag.objects.create(tagged_item=bookmark, tag='bookmark')
+            Tag.objects.create(tagged_item=note, tag='note')
+
+        class TagSerializer(serializers.ModelSerializer):
+            tagged_item = GenericRelatedField({
+                Bookmark: BookmarkSerializer(),
+                Note: NoteSerializer(),
+            }, read_only=True)
+
+            class Meta:
+                model = Tag
+                exclude = ('id', 'content_type', 'object_id', )
+                list_serializer_class = GenericRelatedListSerializer
+
+        serializer = TagSerializer(Tag.objects.order_by('pk'), many=True)
+        # The tags, then the targets of each content type.
+        with self.assertNumQueries(1 + 2):
+            actual = async_to_sync(serializer.ato_representation)()
+        self.assertEqual(len(actual), 6)
+        self.assertEqual(actual[:2], [
+            {'tag': 'bookmark', 'tagged_item': {'url': 'https://example.com/0/'}},
+            {'tag': 'note', 'tagged_item': {'text': 'Note 0'}},
+        ])
+
+    def test_ato_internal_value(self):
+        url = reverse('note-detail', kwargs={'pk': self.notes[1].pk})
+        field = self.serializer_class().fields['tagged_item']
+        with self.assertNumQueries(1):
+            actual = async_to_sync(field.ato_internal_value)(url)
+        self.assertEqual(actual, self.notes[1])
+
+    def test_errors(self):
+        missing = reverse('note-detail', kwargs={'pk': 1234})
+        data = [
+            {'tag': 'tag', 'tagged_item': reverse('note-detail', kwargs={'pk': self.notes[0].pk})},
+            {'tag': 'tag', 'tagged_item': missing},
+            {'tag': 'tag', 'tagged_item': 'foo-bar'},
+        ]
+        serializer = self.serializer_class(data=data, many=True)
+        self.assertFalse(serializer.is_valid())
+        message = 'Could not determine a valid serializer for value %r.'
+        self.assertEqual(serializer.errors, [
+            {},
+            {'tagged_item': {api_settings.NON_FIELD_ERRORS_KEY: message % missing}},
+            {'tagged_item': {api_settings.NON_FIELD_ERRORS_KEY: message % 'foo-bar'}},
+        ])
+
+    def test_pointers(self):
+        bookmark, note = self.bookmarks[0], self.notes[0]
+        for obj in (bookmark, note, bookmark, bookmark):
+            Tag.objects.create(tagged_item=obj, tag='tag')
+
+        class TagSerializer(serializers.ModelSerializer):
+            tagged_item = GenericRelatedField(
+                {Bookmark: BookmarkSerializer(), Note: NoteSerializer()},
+                pointers=True,
+            )
+
+            class Meta:
+                model = Tag
+                fields = ('tag', 'tagged_item')
+                list_serializer_class = GenericRelatedListSerializer
+
+        serializer = TagSerializer(Tag.objects.order_by('pk'), many=True)
+        with mock.patch.object(
+                BookmarkSerializer, 'to_representation', autospec=True,
+                side_effect=BookmarkSerializer.to_representation) as to_representation:
+            data = serializer.data
+        self.assertEqual(to_representation.call_count, 1)
+        bookmark_pointer = {'type': 'bookmark', 'id': bookmark.pk}
+        note_pointer = {'type': 'note', 'id': note.pk}
+        self.assertEqual(
+            [item['tagged_item'] for item in data],
+            [bookmark_pointer, note_pointer, bookmark_pointer, bookmark_pointer],
+        )
+        self.assertEqual(serializer.included, [
+            dict(bookmark_pointer, attributes={'url': bookmark.url}),
+            dict(note_pointer, attributes={'text': note.text}),
+        ])
+
+        # Outside lists, targets are represented in full.
+        serializer = TagSerializer(Tag.objects.order_by('pk').first())
+        self.assertEqual(serializer.data['tagged_item'], {'url': bookmark.url})
+        self.assertEqual(serializer.context.get(INCLUDED_CONTEXT_KEY), None)
+
+    def test_pointers_of_several_fields(self):
+        bookmark = self.bookmarks[0]
+        Tag.objects.create(tagged_item=bookmark, tag='tag')
+
+        class TaggedBookmarkSerializer(serializers.ModelSerializer):
+            class Meta:
+                model = Bookmark
+                fields = ('id', 'url')
+
+        class TagSerializer(serializers.ModelSerializer):
+            tagged_item = GenericRelatedField({Bookmark: BookmarkSerializer()}, pointers=True)
+            bookmark = GenericRelatedField(
+                {Bookmark: TaggedBookmarkSerializer()}, source='tagged_item', pointers=True)
+
+            class Meta:
+                model = Tag
+                fields = ('tagged_item', 'bookmark')
+                list_serializer_class = GenericRelatedListSerializer
+
+        serializer = TagSerializer(Tag.objects.all(), many=True)
+        pointer = {'type': 'bookmark', 'id': bookmark.pk}
+        self.assertEqual(serializer.data, [{'tagged_item': pointer, 'bookmark': pointer}])
+        # Targets are included once, as represented by the first field.
+        self.assertEqual(serializer.included, [dict(pointer, attributes={'url': bookmark.url})])
+
+    def test_fieldsets(self):
+        bookmark, note = self.bookmarks[0], self.notes[0]
+        tag = Tag.objects.create(tagged_item=bookmark, tag='bookmark')
+        Tag.objects.create(tagged_item=note, tag='note')
+
+        class BookmarkSerializer(serializers.ModelSerializer):
+            tags = serializers.StringRelatedField(many=True)
+
+            class Meta:
+                model = Bookmark
+                fields = ('id', 'url', 'tags')
+
+        class NoteSerializer(serializers.ModelSerializer):
+            class Meta:
+                model = Note
+                fields = ('id', 'text')
+
+        class TagSerializer(serializers.ModelSerializer):
+            tagged_item = GenericRelatedField({
+                Bookmark: BookmarkSerializer(),
+                Note: NoteSerializer(),
+            })
+
+            class Meta:
+                model = Tag
+                fields = ('tagged_item',)
+
+        params = {'fields[bookmark]': 'id,tags', 'fields[note]': 'text'}
+        context = {'request': Request(factory.get('/', params))}
+        serializer = TagSerializer(Tag.objects.order_by('pk'), many=True, context=context)
+        with CaptureQueriesContext(connection) as queries:
+            data = serializer.data
+        self.assertEqual(data, [
+            {'tagged_item': {'id': bookmark.pk, 'tags': [str(tag)]}},
+            {'tagged_item': {'text': note.text}},
+        ])
+        bookmark_query = next(
+            query['sql'] for query in queries.captured_queries
+            if 'FROM "tests_bookmark"' in query['sql'])
+        self.assertNotIn('"url"', bookmark_query)
+
+    def test_fieldsets_unknown_fields(self):
+        note = self.notes[0]
+        Tag.objects.create(tagged_item=note, tag='note')
+
+        class NoteSerializer(serializers.ModelSerializer):
+            class Meta:
+                model = Note
+                fields = ('id', 'text')
+
+        class TagSerializer(serializers.ModelSerializer):
+            tagged_item = GenericRelatedField({Note: NoteSerializer()})
+
+            class Meta:
+                model = Tag
+                fields = ('tagged_item',)
+
+        for names, expected in [
+            ('text,foo', {'text': note.text}),
+            ('foo,text', {'text': note.text}),
+            ('text', {'text': note.text}),
+            ('text,id,bar', {'id': note.pk, 'text': note.text}),
+        ]:
+            context = {'request': Request(factory.get('/', {'fields[note]': names}))}
+            serializer = TagSerializer(Tag.objects.all(), many=True, context=context)
+            self.assertEqual(serializer.data, [{'tagged_item': expected}])
+        registry = TagSerializer._declared_fields['tagged_item'].registry
+        self.assertEqual(list(registry._sparse_classes), [(NoteSerializer, ('text',))])
+
+    def test_fieldsets_with_select_related(self):
+        tag = Tag.objects.create(tagged_item=self.bookmarks[0], tag='bookmark')
+        Detachable.objects.create(name='tagged', content_object=tag)
+
+        class TagSerializer(serializers.ModelSerializer):
+            class Meta:
+                model = Tag
+                fields = ('tag', 'object_id')
+                select_related = ('content_type',)
+
+            def to_representation(self, instance):
+                return dict(super(TagSerializer, self).to_representation(instance), type='tag')
+
+        class DetachableSerializer(serializers.ModelSerializer):
+            content_object = GenericRelatedField({Tag: TagSerializer()})
+
+            class Meta:
+                model = Detachable
+                fields = ('content_object',)
+
+        context = {'request': Request(factory.get('/', {'fields[tag]': 'tag'}))}
+        serializer = DetachableSerializer(Detachable.objects.all(), many=True, context=context)
+        self.assertEqual(serializer.data, [{'content_object': {'tag': 'bookmark', 'type': 'tag'}}])
+
+
 class TestGenericRelatedField(TestCase):
     def test_multiple_declaration(self):
         with self.assertRaises(RuntimeError):
@@ -483,3 +1139,213 @@ class TestGenericRelatedField(TestCase):
 
                 class Meta:
                     model = Tag
+
+    def test_prepare(self):
+        field = GenericRelatedField({
+            'tests.Bookmark': BookmarkSerializer,
+            Note: NoteSerializer(),
+        })
+        field.prepare()
+        self.assertEqual(
+            [model for model, serializer in field.serializers.bound_items()], [Bookmark, Note])
+        self.assertEqual(field.registry.models_by_class[NoteProxy], Note)
+        self.assertIsNone(field.registry.models_by_class[Tag])
+        self.assertEqual(field.registry.related_lookups, {Bookmark: ([], []), Note: ([], [])})
+
+    def test_warm_content_types(self):
+        field = GenericRelatedField({Bookmark: BookmarkSerializer(), Note: NoteSerializer()})
+        bookmark_id = ContentType.objects.get_for_model(Bookmark).pk
+        ContentType.objects.clear_cache()
+        prepare_fields(warm_content_types=True)
+        with self.assertNumQueries(0):
+            ContentType.objects.get_for_id(bookmark_id)
+            ContentType.objects.get_for_model(Note)
+        self.assertEqual(field.registry.models_by_class[NoteProxy], Note)
+
+    @override_settings(GENERIC_RELATIONS_PREPARE=True)
+    def test_ready(self):
+        config = apps.get_app_config('generic_relations')
+        with mock.patch('generic_relations.apps.autodiscover_modules') as autodiscover, \
+                mock.patch('generic_relations.serializers.prepare_fields') as prepare:
+            config.ready()
+        autodiscover.assert_called_once_with('serializers')
+        prepare.assert_called_once_with(warm_content_types=False)
+
+
+class TestGenericRelationSerializer(TestCase):
+    def setUp(self):
+        class TagSerializer(serializers.ModelSerializer):
+            id = serializers.IntegerField(required=False)
+
+            class Meta:
+                model = Tag
+                fields = ('id', 'tag')
+
+        class BookmarkSerializer(WritableGenericRelationsMixin, serializers.ModelSerializer):
+            tags = GenericRelationSerializer(child=TagSerializer(), key='id')
+
+            class Meta:
+                model = Bookmark
+                fields = ('url', 'tags')
+
+        self.serializer_class = BookmarkSerializer
+        self.bookmark = Bookmark.objects.create(url='https://www.djangoproject.com/')
+        self.tags = [
+            Tag.objects.create(tag='tag-%d' % i, tagged_item=self.bookmark) for i in range(10)
+        ]
+        self.note = Note.objects.create(text='Remember the milk')
+        self.note_tag = Tag.objects.create(tag='tag-0', tagged_item=self.note)
+
+    def test_create(self):
+        serializer = self.serializer_class(data={
+            'url': 'https://www.example.com/',
+            'tags': [{'tag': 'django'}, {'tag': 'python'}],
+        })
+        serializer.is_valid(raise_exception=True)
+        bookmark = serializer.save()
+        self.assertEqual(
+            sorted(bookmark.tags.values_list('tag', flat=True)), ['django', 'python'])
+
+    def test_update(self):
+        data = {
+            'url': 'https://www.djangoproject.com/',
+            'tags': (
+                [{'id': tag.id, 'tag': tag.tag} for tag in self.tags[:3]]
+                + [{'id': tag.id, 'tag': 'renamed-%d' % tag.id} for tag in self.tags[3:6]]
+                + [{'tag': 'new-%d' % i} for i in range(5)]
+            ),
+        }
+        serializer = self.serializer_class(self.bookmark, data=data)
+        serializer.is_valid(raise_exception=True)
+        # A savepoint, the bookmark, and reading, creating, updating and
+        # deleting tags, whatever their number.
+        with self.assertNumQueries(7):
+            serializer.save()
+
+        self.assertEqual(
+            sorted(self.bookmark.tags.values_list('tag', flat=True)),
+            sorted(
+                ['tag-0', 'tag-1', 'tag-2']
+                + ['renamed-%d' % tag.id for tag in self.tags[3:6]]
+                + ['new-%d' % i for i in range(5)]
+            ),
+        )
+        self.assertTrue(Tag.objects.filter(pk=self.note_tag.pk).exists())
+
+    def test_duplicate_key(self):
+        tag = self.tags[0]
+        serializer = self.serializer_class(self.bookmark, data={
+            'url': 'https://www.djangoproject.com/',
+            'tags': [{'id': tag.id, 'tag': 'a'}, {'id': tag.id, 'tag': 'b'}],
+        })
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('tags', serializer.errors)
+
+    def test_natural_key(self):
+        class TagSerializer(serializers.ModelSerializer):
+            class Meta:
+                model = Tag
+                fields = ('tag',)
+
+        class BookmarkSerializer(WritableGenericRelationsMixin, serializers.ModelSerializer):
+            tags = GenericRelationSerializer(child=TagSerializer(), key='tag')
+
+            class Meta:
+                model = Bookmark
+                fields = ('url', 'tags')
+
+        bookmark = Bookmark.objects.create(url='https://www.example.com/')
+        kept, duplicate, removed = [
+            Tag.objects.create(tag=tag, tagged_item=bookmark) for tag in ('a', 'a', 'b')]
+        serializer = BookmarkSerializer(bookmark, data={
+            'url': 'https://www.example.com/',
+            'tags': [{'tag': 'a'}, {'tag': 'c'}],
+        })
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.assertEqual(sorted(bookmark.tags.values_list('tag', flat=True)), ['a', 'c'])
+        self.assertTrue(Tag.objects.filter(pk=kept.pk).exists())
+        self.assertFalse(Tag.objects.filter(pk__in=[duplicate.pk, removed.pk]).exists())
+
+    def test_unknown_key(self):
+        for key in (4242, self.note_tag.pk):
+            serializer = self.serializer_class(self.bookmark, data={
+                'url': 'https://www.djangoproject.com/',
+                'tags': [{'id': key, 'tag': 'stolen'}],
+            })
+            serializer.is_valid(raise_exception=True)
+            with self.assertRaises(serializers.ValidationError) as context:
+                serializer.save()
+            self.assertIn('tags', context.exception.detail)
+        self.assertFalse(Tag.objects.filter(pk=4242).exists())
+        self.assertEqual(Tag.objects.get(pk=self.note_tag.pk).tag, 'tag-0')
+        self.assertEqual(self.bookmark.tags.count(), 10)
+
+
+@override_settings(ROOT_URLCONF='generic_relations.tests.test_relations')
+class TestInstrumentation(TestCase):
+    def setUp(self):
+        self.note = Note.objects.create(text='Remember the milk')
+        self.measurements = []
+
+    def test_serialize(self):
+        field = GenericRelatedField({
+            Bookmark: BookmarkSerializer(),
+            Note: NoteSerializer(),
+        })
+        with instrumentation.instrument(self.measurements.append):
+            field.to_representation(self.note)
+        measurement, = self.measurements
+        self.assertEqual(measurement.operation, 'serialize')
+        self.assertIs(measurement.field, field)
+        self.assertIs(measurement.model, Note)
+        self.assertEqual(measurement.candidates, 0)
+        self.assertEqual(measurement.queries, 0)
+        self.assertGreater(measurement.serialization_time, 0)
+        self.assertAlmostEqual(
+            measurement.duration,
+            measurement.dispatch_time + measurement.serialization_time)
+
+    def test_deserialize(self):
+        field = GenericRelatedField({
+            Bookmark: BookmarkSerializer(),
+            Note: NoteSerializer(),
+        })
+        with instrumentation.instrument(self.measurements.append):
+            field.to_internal_value({'text': 'Reticulate the splines', 'url': 'splines'})
+            with self.assertRaises(serializers.ValidationError):
+                field.to_internal_value({'text': '', 'url': 'splines'})
+        found, missing = self.measurements
+        self.assertEqual((found.model, found.candidates, found.failures), (Note, 2, 1))
+        self.assertEqual((missing.model, missing.candidates, missing.failures), (None, 2, 2))
+
+    def test_deserialize_hyperlink(self):
+        field = GenericRelatedField({
+            Bookmark: serializers.HyperlinkedRelatedField(
+                view_name='bookmark-detail',
+                queryset=Bookmark.objects.all()),
+            Note: serializers.HyperlinkedRelatedField(
+                view_name='note-detail',
+                queryset=Note.objects.all()),
+        })
+        with instrumentation.instrument(self.measurements.append):
+            field.to_internal_value(reverse('note-detail', kwargs={'pk': self.note.pk}))
+        measurement, = self.measurements
+        self.assertEqual((measurement.model, measurement.queries), (Note, 1))
+
+    def test_other_threads(self):
+        field = GenericRelatedField({Note: NoteSerializer()})
+        with instrumentation.instrument(self.measurements.append):
+            thread = threading.Thread(target=field.to_representation, args=(self.note,))
+            thread.start()
+            thread.join()
+            self.assertEqual(self.measurements, [])
+            async_to_sync(field.ato_representation)(self.note)
+        self.assertEqual(len(self.measurements), 1)
+
+    def test_disabled(self):
+        field = GenericRelatedField({Note: NoteSerializer()})
+        with mock.patch.object(instrumentation, 'Measurement') as Measurement:
+            field.to_representation(self.note)
+            field.to_internal_value({'text': 'Reticulate the splines'})
+        Measurement.assert_not_called()
@@ -1,10 +1,22 @@
 
 
-from django.test import TestCase
+import copy
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.http import QueryDict
+from django.test import RequestFactory, TestCase
+from django.utils.module_loading import import_string
 
 from rest_framework import serializers
 
-from generic_relations.serializers import GenericModelSerializer
+from generic_relations import instrumentation
+from generic_relations.cache import RepresentationCache, RepresentationMemo
+from generic_relations.serializers import GenericModelListSerializer, GenericModelSerializer
 from generic_relations.tests.models import Bookmark, Note
 
 from .test_relations import BookmarkSerializer, NoteSerializer
@@ -45,6 +57,117 @@ class TestGenericModelSerializer(TestCase):
             {'text': 'Remember the milk'},
         )
 
+    def test_copy(self):
+        serializer = copy.deepcopy(self.serializer)
+        self.assertIs(serializer.registry, self.serializer.registry)
+        self.assertEqual(list(serializer.serializers), [Bookmark, Note])
+        self.assertEqual(list(serializer.serializers.bound_items()), [])
+
+        self.assertEqual(serializer.to_representation(self.note), {'text': 'Remember the milk'})
+        (model, note_serializer), = serializer.serializers.bound_items()
+        self.assertIs(model, Note)
+        self.assertIsNot(note_serializer, self.serializer.serializers[Note])
+        self.assertIs(note_serializer.parent, serializer)
+
+        list_serializer = copy.deepcopy(GenericModelSerializer(
+            {
+                Bookmark: BookmarkSerializer(),
+                Note: NoteSerializer(),
+            },
+            many=True,
+        ))
+        self.assertEqual(list(list_serializer.child.serializers.bound_items()), [])
+
+    def test_change_serializers(self):
+        copied = copy.deepcopy(self.serializer)
+        del self.serializer.serializers[Bookmark]
+        self.assertEqual(list(self.serializer.serializers), [Note])
+        with self.assertRaises(serializers.ValidationError):
+            self.serializer.to_internal_value({'url': 'https://www.djangoproject.com/'})
+
+        bookmark_serializer = BookmarkSerializer()
+        self.serializer.serializers['tests.Bookmark'] = bookmark_serializer
+        self.assertIs(bookmark_serializer.parent, self.serializer)
+        self.assertIs(self.serializer.serializers[Bookmark], bookmark_serializer)
+        self.assertEqual(
+            copy.deepcopy(self.serializer).to_representation(self.bookmark),
+            {'url': 'https://www.djangoproject.com/'},
+        )
+        with self.assertRaises(RuntimeError):
+            self.serializer.serializers[Bookmark] = bookmark_serializer
+
+        # Copies made before keep their serializers.
+        self.assertIsNot(copied.registry, self.serializer.registry)
+        self.assertEqual(list(copied.serializers), [Bookmark, Note])
+
+        copied.serializers.clear()
+        mapping = copied.serializers
+        mapping.update({Note: NoteSerializer(), Bookmark: BookmarkSerializer()})
+        self.assertIs(copied.serializers, mapping)
+        self.assertEqual(list(copied.serializers), [Note, Bookmark])
+        self.assertEqual(list(copied.registry.serializers), [Note, Bookmark])
+
+    def test_lazy_serializers(self):
+        serializer = GenericModelSerializer({
+            'tests.Bookmark': 'generic_relations.tests.test_relations.BookmarkSerializer',
+            Note: NoteSerializer,
+        })
+        with mock.patch('generic_relations.serializers.import_string', wraps=import_string) as imported:
+            self.assertEqual(serializer.to_representation(self.note), {'text': 'Remember the milk'})
+            imported.assert_not_called()
+            self.assertEqual([model for model, child in serializer.serializers.bound_items()], [Note])
+
+            for i in range(2):
+                self.assertEqual(
+                    copy.deepcopy(serializer).to_representation(self.bookmark),
+                    {'url': 'https://www.djangoproject.com/'},
+                )
+            imported.assert_called_once_with('generic_relations.tests.test_relations.BookmarkSerializer')
+
+        self.assertEqual(
+            serializer.to_internal_value({'url': 'https://www.djangoproject.com/'}),
+            {'url': 'https://www.djangoproject.com/'},
+        )
+
+    def test_candidates_pruned(self):
+        measurements = []
+        with instrumentation.instrument(measurements.append):
+            self.serializer.to_internal_value({'url': 'https://www.djangoproject.com/'})
+            self.serializer.to_internal_value(
+                QueryDict('url=https://www.djangoproject.com/'))
+            with self.assertRaises(serializers.ValidationError):
+                self.serializer.to_internal_value({})
+            # Nothing is required in partial updates, so both serializers match.
+            self.list_serializer.partial = True
+            with self.assertRaises(serializers.ValidationError):
+                self.serializer.to_internal_value({'url': 'https://www.djangoproject.com/'})
+        self.assertEqual([measurement.candidates for measurement in measurements], [1, 2, 0, 2])
+
+    def test_first_match_resolution(self):
+        serializer = GenericModelSerializer(
+            {
+                Bookmark: BookmarkSerializer(),
+                Note: NoteSerializer(),
+            },
+            resolution='first-match',
+        )
+        note = {'text': 'Remember the milk', 'url': 'milk'}
+        measurements = []
+        with instrumentation.instrument(measurements.append):
+            for i in range(3):
+                self.assertEqual(serializer.to_internal_value(note), {'text': 'Remember the milk'})
+        # Notes are tried first once they've matched more often than bookmarks.
+        self.assertEqual([measurement.candidates for measurement in measurements], [2, 1, 1])
+        self.assertEqual(serializer.registry.get_candidate_order(), (Note, Bookmark))
+
+        both = {'text': 'Remember the milk', 'url': 'https://www.djangoproject.com/'}
+        self.assertEqual(serializer.to_internal_value(both), {'text': 'Remember the milk'})
+        with self.assertRaises(serializers.ValidationError):
+            self.serializer.to_internal_value(both)
+
+        with self.assertRaises(ImproperlyConfigured):
+            GenericModelSerializer({Note: NoteSerializer()}, resolution='last-match')
+
     def test_serialize_list(self):
         actual = self.list_serializer.to_representation([
             self.bookmark, self.note, self.note2, self.bookmark,
@@ -80,3 +203,339 @@ class TestGenericModelSerializer(TestCase):
 
         with self.assertRaises(serializers.ValidationError):
             serializer.is_valid(raise_exception=True)
+
+
+class TestDiscriminatedGenericModelSerializer(TestCase):
+    def setUp(self):
+        self.serializer = GenericModelSerializer(
+            {
+                Bookmark: BookmarkSerializer(),
+                Note: NoteSerializer(),
+            },
+            discriminator='type',
+        )
+
+    def test_deserialize(self):
+        self.assertEqual(
+            self.serializer.to_internal_value({'type': 'note', 'text': 'Remember the milk'}),
+            {'text': 'Remember the milk'},
+        )
+
+    def test_discriminator_resolves_ambiguous_data(self):
+        # Without a discriminator both serializers accept this data.
+        data = {
+            'type': 'bookmark',
+            'url': 'https://www.djangoproject.com/',
+            'text': 'Remember the milk',
+        }
+        self.assertEqual(
+            self.serializer.get_deserializer_for_data(data),
+            self.serializer.serializers[Bookmark],
+        )
+
+    def test_missing_or_unknown_type(self):
+        for data in ({'text': 'Remember the milk'}, {'type': 'tag', 'tag': 'django'}, 'note'):
+            with self.assertRaises(serializers.ValidationError) as cm:
+                self.serializer.to_internal_value(data)
+            self.assertEqual(cm.exception.detail, ['Invalid model - model not available.'])
+
+    def test_callable_discriminator(self):
+        serializer = GenericModelSerializer(
+            {
+                Bookmark: BookmarkSerializer(),
+                Note: NoteSerializer(),
+            },
+            discriminator=lambda data: 'bookmark' if 'url' in data else 'note',
+        )
+        self.assertIs(
+            serializer.get_deserializer_for_data({'text': 'Remember the milk'}),
+            serializer.serializers[Note],
+        )
+
+
+class TestRepresentationMemo(TestCase):
+    def setUp(self):
+        self.bookmark = Bookmark.objects.create(
+            url='https://www.djangoproject.com/')
+        self.note = Note.objects.create(text='Remember the milk')
+        self.note2 = Note.objects.create(text='Reticulate the splines')
+
+    def test_repeated_instances_serialized_once(self):
+        serializer = GenericModelSerializer(
+            {
+                Bookmark: BookmarkSerializer(),
+                Note: NoteSerializer(),
+            },
+            memo_size=10,
+            many=True,
+        )
+        items = [self.bookmark, self.note, self.bookmark, self.note, self.note2]
+        with mock.patch.object(
+                NoteSerializer, 'to_representation', autospec=True,
+                side_effect=serializers.ModelSerializer.to_representation) as to_representation:
+            actual = serializer.to_representation(items)
+        self.assertEqual(actual, [
+            {'url': 'https://www.djangoproject.com/'},
+            {'text': 'Remember the milk'},
+            {'url': 'https://www.djangoproject.com/'},
+            {'text': 'Remember the milk'},
+            {'text': 'Reticulate the splines'},
+        ])
+        self.assertEqual(to_representation.call_count, 2)
+
+    def test_least_recently_used_evicted(self):
+        memo = RepresentationMemo(2)
+        memo.set('a', 1)
+        memo.set('b', 2)
+        self.assertEqual(memo.get('a'), 1)
+        memo.set('c', 3)
+        self.assertEqual(len(memo), 2)
+        self.assertEqual(memo.get('b'), None)
+        self.assertEqual(memo.get('a'), 1)
+        self.assertEqual(memo.get('c'), 3)
+
+
+class TestRepresentationCache(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.note = Note.objects.create(text='Remember the milk')
+        self.cache = RepresentationCache(key_prefix='test')
+        self.serializer = GenericModelSerializer(
+            {
+                Bookmark: BookmarkSerializer(),
+                Note: NoteSerializer(),
+            },
+            cache=self.cache,
+        )
+
+    def test_cached_across_serializers(self):
+        self.assertEqual(self.serializer.to_representation(self.note), {'text': 'Remember the milk'})
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 1))
+
+        serializer = copy.deepcopy(self.serializer)
+        self.assertIs(serializer.cache, self.cache)
+        with mock.patch.object(NoteSerializer, 'to_representation') as to_representation:
+            self.assertEqual(serializer.to_representation(self.note), {'text': 'Remember the milk'})
+        to_representation.assert_not_called()
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_invalidated_on_save(self):
+        self.serializer.to_representation(self.note)
+        self.note.text = 'Reticulate the splines'
+        self.note.save()
+        self.assertEqual(
+            self.serializer.to_representation(self.note),
+            {'text': 'Reticulate the splines'},
+        )
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+
+    def test_serializers_of_the_same_name(self):
+        def get_serializer_class(fields):
+            class NoteSerializer(serializers.ModelSerializer):
+                class Meta:
+                    model = Note
+
+            NoteSerializer.Meta.fields = fields
+            return NoteSerializer
+
+        for fields, expected in ((('text',), {'text': 'Remember the milk'}), (('id',), {'id': self.note.pk})):
+            serializer = GenericModelSerializer({Note: get_serializer_class(fields)()}, cache=self.cache)
+            self.assertEqual(serializer.to_representation(self.note), expected)
+
+    def test_request_in_key(self):
+        class NoteSerializer(serializers.ModelSerializer):
+            url = serializers.SerializerMethodField()
+
+            class Meta:
+                model = Note
+                fields = ('url',)
+
+            def get_url(self, obj):
+                return self.context['request'].build_absolute_uri('/note/%d/' % obj.pk)
+
+        for secure in (False, True):
+            request = RequestFactory().get('/', secure=secure)
+            serializer = GenericModelSerializer(
+                {Note: NoteSerializer()}, cache=self.cache, context={'request': request})
+            self.assertEqual(
+                serializer.to_representation(self.note)['url'],
+                '%s://testserver/note/%d/' % ('https' if secure else 'http', self.note.pk),
+            )
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+
+    def test_invalidated_on_delete(self):
+        self.serializer.to_representation(self.note)
+        key = self.cache.get_key(self.cache.get_serializer_key(NoteSerializer()), self.note)
+        self.assertIn(key, caches['default'])
+        self.note.delete()
+        self.assertNotIn(key, caches['default'])
+
+
+class BatchListSerializer(serializers.ListSerializer):
+    batches = []
+
+    def to_representation(self, data):
+        self.batches.append(list(data))
+        return super(BatchListSerializer, self).to_representation(data)
+
+
+class BatchNoteSerializer(NoteSerializer):
+    class Meta(NoteSerializer.Meta):
+        list_serializer_class = BatchListSerializer
+
+
+class TestGenericModelListSerializer(TestCase):
+    def setUp(self):
+        self.bookmark = Bookmark.objects.create(
+            url='https://www.djangoproject.com/')
+        self.note = Note.objects.create(text='Remember the milk')
+        self.note2 = Note.objects.create(text='Reticulate the splines')
+        BatchListSerializer.batches = []
+
+    def test_serialized_by_type(self):
+        serializer = GenericModelSerializer(
+            {
+                Bookmark: BookmarkSerializer(),
+                Note: BatchNoteSerializer(),
+            },
+            many=True,
+        )
+        self.assertIsInstance(serializer, GenericModelListSerializer)
+
+        actual = serializer.to_representation([
+            self.note, self.bookmark, self.note2, self.bookmark, self.note,
+        ])
+        self.assertEqual(actual, [
+            {'text': 'Remember the milk'},
+            {'url': 'https://www.djangoproject.com/'},
+            {'text': 'Reticulate the splines'},
+            {'url': 'https://www.djangoproject.com/'},
+            {'text': 'Remember the milk'},
+        ])
+        self.assertEqual(BatchListSerializer.batches, [[self.note, self.note2, self.note]])
+
+    def test_custom_to_representation(self):
+        class TypedSerializer(GenericModelSerializer):
+            def to_representation(self, instance):
+                representation = super(TypedSerializer, self).to_representation(instance)
+                return dict(representation, type=self.get_model_type(type(instance)))
+
+        serializer = TypedSerializer(
+            {
+                Bookmark: BookmarkSerializer(),
+                Note: BatchNoteSerializer(),
+            },
+            many=True,
+        )
+        self.assertEqual(serializer.to_representation([self.note, self.bookmark]), [
+            {'text': 'Remember the milk', 'type': 'note'},
+            {'url': 'https://www.djangoproject.com/', 'type': 'bookmark'},
+        ])
+        self.assertEqual(BatchListSerializer.batches, [])
+
+    def test_ato_representation(self):
+        serializer = GenericModelSerializer(
+            {
+                Bookmark: BookmarkSerializer(),
+                Note: BatchNoteSerializer(),
+            },
+            many=True,
+        )
+        items = [self.note, self.bookmark, self.note2]
+        actual = async_to_sync(serializer.ato_representation)(items)
+        self.assertEqual(actual, serializer.to_representation(items))
+
+    def test_iter_representation(self):
+        serializer = GenericModelSerializer(
+            {
+                Bookmark: BookmarkSerializer(),
+                Note: BatchNoteSerializer(),
+            },
+            many=True,
+        )
+        items = [self.note, self.bookmark, self.note2, self.bookmark, self.note]
+        actual = serializer.iter_representation(items, chunk_size=2)
+        self.assertEqual(list(actual), serializer.to_representation(items))
+        self.assertEqual(
+            BatchListSerializer.batches[:3],
+            [[self.note], [self.note2], [self.note]],
+        )
+
+    def test_create(self):
+        data = [
+            {'text': 'Buy eggs'},
+            {'url': 'https://www.example.com/'},
+            {'text': 'Buy flour'},
+            {'text': 'Bake'},
+        ]
+        serializer = GenericModelSerializer(
+            {
+                Bookmark: BookmarkSerializer(),
+                Note: NoteSerializer(),
+            },
+            many=True,
+            batch_size=2,
+            data=data,
+        )
+        serializer.is_valid(raise_exception=True)
+        # Two batches of notes, and one of bookmarks.
+        with self.assertNumQueries(3):
+            instances = serializer.save()
+
+        self.assertEqual([type(instance) for instance in instances], [Note, Bookmark, Note, Note])
+        self.assertEqual(
+            serializer.data,
+            [dict(item) for item in data],
+        )
+        self.assertTrue(all(instance.pk for instance in instances))
+        self.assertEqual(
+            set(Note.objects.values_list('text', flat=True)),
+            {'Remember the milk', 'Reticulate the splines', 'Buy eggs', 'Buy flour', 'Bake'},
+        )
+
+    def test_create_without_returned_keys(self):
+        data = [{'text': 'Buy eggs'}, {'text': 'Buy flour'}]
+        serializer = GenericModelSerializer({Note: NoteSerializer()}, many=True, data=data)
+        serializer.is_valid(raise_exception=True)
+        features = mock.patch.object(
+            type(connection.features), 'can_return_rows_from_bulk_insert', new_callable=mock.PropertyMock,
+            return_value=False)
+        # One query per note.
+        with features, self.assertNumQueries(2):
+            instances = serializer.save()
+        self.assertTrue(all(instance.pk for instance in instances))
+
+    def test_fieldsets(self):
+        class NoteSerializer(serializers.ModelSerializer):
+            class Meta:
+                model = Note
+                fields = ('id', 'text')
+
+        serializer = GenericModelSerializer(
+            {
+                Bookmark: BookmarkSerializer(),
+                Note: NoteSerializer(),
+            },
+            many=True,
+            context={'fieldsets': {'note': ['text']}},
+        )
+        self.assertEqual(serializer.to_representation([self.note, self.bookmark]), [
+            {'text': 'Remember the milk'},
+            {'url': 'https://www.djangoproject.com/'},
+        ])
+        # The registered serializer still deserializes every field.
+        self.assertEqual(
+            list(serializer.child.serializers[Note].fields), ['id', 'text'])
+
+    def test_create_one(self):
+        serializer = GenericModelSerializer(
+            {
+                Bookmark: BookmarkSerializer(),
+                Note: NoteSerializer(),
+            },
+            data={'url': 'https://www.example.com/'},
+        )
+        serializer.is_valid(raise_exception=True)
+        bookmark = serializer.save()
+        self.assertIsInstance(bookmark, Bookmark)
+        self.assertEqual(Bookmark.objects.get(pk=bookmark.pk).url, 'https://www.example.com/')
@@ -26,15 +26,14 @@ setup(
     author_email="python@ian.feete.org",
     packages=find_packages(),
     include_package_data=True,
-    install_requires=["djangorestframework>=3.11.0"],
-    python_requires=">=3.6",
+    install_requires=["djangorestframework>=3.11.0", "asgiref>=3.2"],
+    python_requires=">=3.7",
     classifiers=[
         "Environment :: Web Environment",
         "Framework :: Django",
         "Intended Audience :: Developers",
         "Operating System :: OS Independent",
         "Programming Language :: Python",
-        "Programming Language :: Python :: 3.6",
         "Programming Language :: Python :: 3.7",
         "Programming Language :: Python :: 3.8",
         "Programming Language :: Python :: 3.9",